@@ -2,6 +2,13 @@
 Algorithms for sorting and grouping trip data without using SQL.
 """
 
+import hashlib
+import json
+import math
+import random
+from array import array
+from itertools import islice
+
 
 def my_sort_trips(trip_list, sort_by_field):
     """
@@ -120,4 +127,528 @@ def find_top_n(trip_list, field, n):
         if i < len(sorted_trips):
             top_trips.append(sorted_trips[i])
 
-    return top_trips
\ No newline at end of file
+    return top_trips
+
+# Sketches
+# Small summaries of a big column that can be built once during the ETL,
+# saved to the database and merged later to answer percentile and
+# distinct-count questions without scanning the trips table again.
+
+
+class KLLSketch:
+    """
+    Quantile sketch (Karnin, Lang, Liberty).
+    Keeps a few hundred values no matter how many are added. Each level
+    holds values that stand for 2**level original values.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.count = 0
+        self.levels = [[]]
+        self.random = random.Random(seed)
+
+    def capacity(self, level):
+        # Top levels keep k values, lower levels shrink by 2/3 each step down
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def stored_size(self):
+        total = 0
+        for values in self.levels:
+            total = total + len(values)
+        return total
+
+    def max_stored_size(self):
+        total = 0
+        for level in range(len(self.levels)):
+            total = total + self.capacity(level)
+        return total
+
+    def add(self, value):
+        self.levels[0].append(value)
+        self.count = self.count + 1
+        if len(self.levels[0]) >= self.capacity(0):
+            self.compress()
+
+    def add_many(self, values):
+        """Add a batch of values and compress once at the end"""
+        for value in values:
+            self.levels[0].append(value)
+            self.count = self.count + 1
+            if len(self.levels[0]) >= 4 * self.k:
+                self.compress()
+        self.compress()
+
+    def compress(self):
+        # Compact full levels into the one above until the sketch fits again
+        while self.stored_size() >= self.max_stored_size():
+            for level in range(len(self.levels)):
+                if len(self.levels[level]) >= self.capacity(level):
+                    if level + 1 == len(self.levels):
+                        self.levels.append([])
+                    self.compact(level)
+                    break
+
+    def compact(self, level):
+        """Keep every other sorted value (random start) and promote it a level up"""
+        values = sorted(self.levels[level])
+
+        # With an odd number of values one stays behind
+        leftover = []
+        if len(values) % 2 == 1:
+            leftover.append(values.pop())
+
+        offset = self.random.randint(0, 1)
+        self.levels[level + 1].extend(values[offset::2])
+        self.levels[level] = leftover
+
+    def merge(self, other):
+        """Add everything from another sketch into this one"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level in range(len(other.levels)):
+            self.levels[level].extend(other.levels[level])
+        self.count = self.count + other.count
+        self.compress()
+
+    def quantiles(self, fractions):
+        """Approximate values at the given fractions (0.5 = median)"""
+        weighted = []
+        for level in range(len(self.levels)):
+            weight = 2 ** level
+            for value in self.levels[level]:
+                weighted.append((value, weight))
+        if not weighted:
+            return [None for _ in fractions]
+
+        weighted.sort()
+        total_weight = 0
+        for _, weight in weighted:
+            total_weight = total_weight + weight
+
+        results = []
+        for fraction in fractions:
+            target = fraction * total_weight
+            seen = 0
+            answer = weighted[-1][0]
+            for value, weight in weighted:
+                seen = seen + weight
+                if seen >= target:
+                    answer = value
+                    break
+            results.append(answer)
+        return results
+
+    def to_json(self):
+        return json.dumps({"k": self.k, "count": self.count, "levels": self.levels})
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        sketch = cls(k=data['k'])
+        sketch.count = data['count']
+        sketch.levels = data['levels']
+        return sketch
+
+
+class HyperLogLog:
+    """
+    Distinct count sketch (Flajolet et al.).
+    Uses 2**precision small registers, about 1.6% error at precision 12.
+    """
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = bytearray(2 ** precision)
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        self.add_hash(int.from_bytes(digest, 'big'))
+
+    def add_hash(self, hash_value):
+        """Add an already hashed 64 bit value"""
+        hash_value = hash_value & 0xFFFFFFFFFFFFFFFF
+        index = hash_value >> (64 - self.precision)
+        rest = (hash_value << self.precision) & 0xFFFFFFFFFFFFFFFF
+
+        # Position of the first 1 bit in what is left of the hash
+        rank = 64 - rest.bit_length() + 1
+        if rank > 64 - self.precision + 1:
+            rank = 64 - self.precision + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        for i in range(len(self.registers)):
+            if other.registers[i] > self.registers[i]:
+                self.registers[i] = other.registers[i]
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+
+        total = 0.0
+        zeros = 0
+        for register in self.registers:
+            total = total + 2.0 ** -register
+            if register == 0:
+                zeros = zeros + 1
+
+        estimate = alpha * m * m / total
+
+        # Small counts are more accurate with linear counting
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+    def to_json(self):
+        return json.dumps({"precision": self.precision, "registers": self.registers.hex()})
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        sketch = cls(precision=data['precision'])
+        sketch.registers = bytearray.fromhex(data['registers'])
+        return sketch
+
+
+
+# Sampling
+# Pick a fair random subset of trips in one pass, instead of taking the
+# first N rows (which are all from the first hours of the month).
+
+def _open_uniform(rng):
+    """Random number strictly between 0 and 1 (log(0) would crash)"""
+    value = rng.random()
+    while value == 0.0:
+        value = rng.random()
+    return value
+
+
+def reservoir_sample(items, k, seed=None):
+    """
+    Pick k items uniformly at random from any iterable in a single pass.
+    Algorithm L (Li, 1994): instead of rolling a die for every item it
+    computes how many items to skip, so most items are never looked at.
+    """
+    rng = random.Random(seed)
+    iterator = iter(items)
+
+    # Fill the reservoir with the first k items
+    reservoir = list(islice(iterator, k))
+    if len(reservoir) < k:
+        return reservoir
+
+    w = math.exp(math.log(_open_uniform(rng)) / k)
+    while True:
+        skip = int(math.log(_open_uniform(rng)) / math.log(1 - w))
+
+        # Jump over `skip` items and take the next one
+        chosen = list(islice(iterator, skip, skip + 1))
+        if not chosen:
+            break
+
+        reservoir[rng.randrange(k)] = chosen[0]
+        w = w * math.exp(math.log(_open_uniform(rng)) / k)
+
+    return reservoir
+
+
+class ReservoirSampler:
+    """
+    Algorithm L fed one item at a time, for when items arrive mixed
+    together (e.g. several strata in one stream).
+    """
+
+    def __init__(self, k, rng):
+        self.k = k
+        self.rng = rng
+        self.items = []
+        self.skip = 0
+        self.w = 1.0
+
+    def add(self, item):
+        if len(self.items) < self.k:
+            self.items.append(item)
+            if len(self.items) == self.k:
+                self.w = math.exp(math.log(_open_uniform(self.rng)) / self.k)
+                self.next_skip()
+            return
+
+        # Still skipping
+        if self.skip > 0:
+            self.skip = self.skip - 1
+            return
+
+        self.items[self.rng.randrange(self.k)] = item
+        self.w = self.w * math.exp(math.log(_open_uniform(self.rng)) / self.k)
+        self.next_skip()
+
+    def next_skip(self):
+        self.skip = int(math.log(_open_uniform(self.rng)) / math.log(1 - self.w))
+
+
+def split_evenly(group_sizes, n):
+    """
+    Share n picks between groups: n // groups each, then the remainder one
+    at a time round-robin. Groups too small for their share pass the rest on.
+    """
+    quotas = {}
+    for group in group_sizes:
+        quotas[group] = 0
+
+    remaining = n
+    while remaining > 0:
+        open_groups = [group for group in sorted(group_sizes) if quotas[group] < group_sizes[group]]
+        if not open_groups:
+            break
+        share = max(1, remaining // len(open_groups))
+        for group in open_groups:
+            extra = min(share, group_sizes[group] - quotas[group], remaining)
+            quotas[group] = quotas[group] + extra
+            remaining = remaining - extra
+    return quotas
+
+
+def split_by_weight(weights, capacities, n):
+    """
+    Share n picks between groups in proportion to their weights (largest
+    remainder first), never giving a group more than its capacity.
+    """
+    quotas = {}
+    for group in weights:
+        quotas[group] = 0
+
+    remaining = n
+    while remaining > 0:
+        open_groups = [group for group in sorted(weights)
+                       if quotas[group] < capacities[group] and weights[group] > 0]
+        if not open_groups:
+            break
+        total = sum(weights[group] for group in open_groups)
+        shares = {}
+        for group in open_groups:
+            shares[group] = remaining * weights[group] / total
+
+        given = 0
+        for group in open_groups:
+            extra = min(int(shares[group]), capacities[group] - quotas[group])
+            quotas[group] = quotas[group] + extra
+            given = given + extra
+
+        # Only fractions left: one more pick each for the largest ones
+        if given == 0:
+            by_fraction = sorted(open_groups, key=lambda group: shares[group] - int(shares[group]), reverse=True)
+            for group in by_fraction[:remaining]:
+                quotas[group] = quotas[group] + 1
+                given = given + 1
+        remaining = remaining - given
+    return quotas
+
+
+def stratified_sample(trip_list, group_field, k_per_group, seed=None):
+    """
+    Pick up to k_per_group trips from every group (e.g. every borough or
+    hour) in one pass, so small groups are not drowned out by big ones.
+    k_per_group can also be a dict of group -> k (see split_evenly).
+    """
+    rng = random.Random(seed)
+    samplers = {}
+
+    for trip in trip_list:
+        group = trip[group_field]
+        if group not in samplers:
+            if isinstance(k_per_group, dict):
+                samplers[group] = ReservoirSampler(k_per_group.get(group, 0), rng)
+            else:
+                samplers[group] = ReservoirSampler(k_per_group, rng)
+        if samplers[group].k > 0:
+            samplers[group].add(trip)
+
+    samples = {}
+    for group in samplers:
+        samples[group] = samplers[group].items
+    return samples
+
+
+
+# Column-based trips
+# One dict per trip costs hundreds of bytes and a hash lookup on every
+# comparison. TripColumns keeps each field in its own column and the
+# functions below sort and select row numbers instead of moving dicts.
+
+class TripColumns:
+    """
+    Trips stored column by column.
+    Numeric fields go in array('d') (8 bytes per value), other fields in lists.
+    """
+
+    __slots__ = ('numeric', 'other', 'length')
+
+    def __init__(self, numeric_fields, other_fields=()):
+        self.numeric = {}
+        for field in numeric_fields:
+            self.numeric[field] = array('d')
+        self.other = {}
+        for field in other_fields:
+            self.other[field] = []
+        self.length = 0
+
+    @classmethod
+    def from_rows(cls, rows, numeric_fields, other_fields=None):
+        """
+        Build columns from database rows in a single pass.
+        rows can be a cursor: each row is appended and then dropped, so the
+        full result set is never held as a list.
+        numeric_fields / other_fields map our field name to the key in each row.
+        Missing numbers (NULL) are stored as 0.0.
+        """
+        if other_fields is None:
+            other_fields = {}
+        columns = cls(numeric_fields, other_fields)
+
+        numeric_targets = [(numeric_fields[field], columns.numeric[field]) for field in numeric_fields]
+        other_targets = [(other_fields[field], columns.other[field]) for field in other_fields]
+
+        length = 0
+        for row in rows:
+            for key, column in numeric_targets:
+                value = row[key]
+                column.append(value if value is not None else 0.0)
+            for key, column in other_targets:
+                column.append(row[key])
+            length = length + 1
+
+        columns.length = length
+        return columns
+
+    def __len__(self):
+        return self.length
+
+    def column(self, field):
+        if field in self.numeric:
+            return self.numeric[field]
+        return self.other[field]
+
+    def row(self, index):
+        """Rebuild one trip as a dict (only done for rows we send back)"""
+        trip = {}
+        for field in self.numeric:
+            trip[field] = self.numeric[field][index]
+        for field in self.other:
+            trip[field] = self.other[field][index]
+        return trip
+
+    def rows(self, indices):
+        result = []
+        for index in indices:
+            result.append(self.row(index))
+        return result
+
+
+def sort_indices(values, descending=False):
+    """
+    Bottom-up merge sort of row numbers by values[row], O(n log n).
+    Stable, and the descending order is built directly (no reverse pass).
+    """
+    n = len(values)
+    current = array('l', range(n))
+    buffer = array('l', range(n))
+
+    width = 1
+    while width < n:
+        for start in range(0, n, 2 * width):
+            middle = min(start + width, n)
+            end = min(start + 2 * width, n)
+            left = start
+            right = middle
+            out = start
+
+            # Merge current[start:middle] and current[middle:end] into buffer
+            while left < middle and right < end:
+                left_value = values[current[left]]
+                right_value = values[current[right]]
+                if (right_value > left_value) if descending else (right_value < left_value):
+                    buffer[out] = current[right]
+                    right = right + 1
+                else:
+                    buffer[out] = current[left]
+                    left = left + 1
+                out = out + 1
+            while left < middle:
+                buffer[out] = current[left]
+                left = left + 1
+                out = out + 1
+            while right < end:
+                buffer[out] = current[right]
+                right = right + 1
+                out = out + 1
+
+        current, buffer = buffer, current
+        width = width * 2
+
+    return current
+
+
+def _sift_down(heap, values, position):
+    """Restore the min-heap property below position (heap holds row numbers)"""
+    size = len(heap)
+    while True:
+        smallest = position
+        left = 2 * position + 1
+        right = left + 1
+        if left < size and values[heap[left]] < values[heap[smallest]]:
+            smallest = left
+        if right < size and values[heap[right]] < values[heap[smallest]]:
+            smallest = right
+        if smallest == position:
+            return
+        heap[position], heap[smallest] = heap[smallest], heap[position]
+        position = smallest
+
+
+def top_n_indices(values, n):
+    """
+    Row numbers of the n largest values, largest first.
+    Keeps a min-heap of the best n seen so far: O(len(values) * log n).
+    """
+    if n <= 0:
+        return array('l')
+
+    heap = array('l')
+    for index in range(min(n, len(values))):
+        heap.append(index)
+    for position in range(len(heap) // 2 - 1, -1, -1):
+        _sift_down(heap, values, position)
+
+    # Replace the smallest kept value whenever a bigger one shows up
+    for index in range(len(heap), len(values)):
+        if values[index] > values[heap[0]]:
+            heap[0] = index
+            _sift_down(heap, values, 0)
+
+    order = sort_indices(array('d', [values[index] for index in heap]), descending=True)
+    result = array('l')
+    for position in order:
+        result.append(heap[position])
+    return result
+
+
+def column_average_by_group(columns, group_field, value_field):
+    """Same as calculate_average_by_group, reading two columns of a TripColumns"""
+    sums = {}
+    counts = {}
+    for group, value in zip(columns.column(group_field), columns.column(value_field)):
+        if group not in sums:
+            sums[group] = 0.0
+            counts[group] = 0
+        sums[group] = sums[group] + value
+        counts[group] = counts[group] + 1
+
+    averages = {}
+    for group in sums:
+        averages[group] = sums[group] / counts[group]
+    return averages
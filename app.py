@@ -1,11 +1,18 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, send_file
 from flask_cors import CORS
 import sqlite3
 import os
-import pandas as pd
+import csv
+import math
+import random
+import threading
+import time
+from collections import Counter
 
 # Import custom sorting functions
-from algorithms import my_sort_trips, sort_trips_descending, group_by_borough, calculate_average_by_group, find_top_n
+from algorithms import KLLSketch, HyperLogLog, split_evenly, split_by_weight, stratified_sample
+from algorithms import TripColumns, top_n_indices, column_average_by_group
+from ingest import MicroBatchIngestor, IngestBackpressure
 
 app = Flask(__name__)
 CORS(app)
@@ -13,15 +20,92 @@ CORS(app)
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'database.db')
+OUTPUT_DIR = os.path.join(BASE_DIR, 'output')
+
+# Map geometry levels written by scripts/convert_spacial.py
+ZONE_DETAIL_LEVELS = ['low', 'medium', 'high', 'full']
+ZONE_CACHE_SECONDS = 86400
+
+# Most rows the custom algorithm endpoints may pull in (?pool=)
+# Even as columns that is a few MB per request, times the worker threads
+MAX_CUSTOM_POOL = 200000
+
+# Most random trip_ids /api/trips/sample looks up per probing round (small boroughs need many)
+MAX_PROBES_PER_ROUND = 50000
+
+# Requested once by warm_up() so the first real visitor does not hit cold caches
+WARM_UP_PATHS = [
+    '/api/zones',
+    '/api/stats/summary',
+    '/api/stats/charts/boroughs',
+    '/api/stats/charts/efficiency',
+    '/api/stats/quality',
+    '/api/analytics/summary',
+]
+READY = {'warmed_up': False}
+
+# Live ingestion (POST /api/ingest) micro-batch settings
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 5000))
+INGEST_MAX_LATENCY = float(os.environ.get('INGEST_MAX_LATENCY', 1.0))  # seconds a row may wait
+INGEST_MAX_PENDING = int(os.environ.get('INGEST_MAX_PENDING', 100000))  # above this, answer 429
+INGEST_MAX_RECORDS = 50000  # per request
+
+
+class ReusableConnection(sqlite3.Connection):
+    """
+    Connection kept open between requests on the same thread.
+    close() only ends the current transaction; the real close happens
+    when the ETL swaps a new database file in.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+
+# One cached connection per server thread, plus the inode of the file it opened
+_local = threading.local()
+
+
+def _database_inode():
+    try:
+        return os.stat(DB_PATH).st_ino
+    except FileNotFoundError:
+        return None
 
 
 def get_db_connection():
-    """Establish a connection to the sqlite database with row mapping"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """
+    Establish a connection to the sqlite database with row mapping.
+    The ETL replaces database.db with a rename, so a new inode means a new
+    generation: the old connection is dropped and the new file opened.
+    """
+    inode = _database_inode()
+    conn = getattr(_local, 'conn', None)
+
+    if conn is None or _local.inode != inode:
+        if conn is not None:
+            conn.really_close()
+        conn = sqlite3.connect(DB_PATH, factory=ReusableConnection)
+        conn.row_factory = sqlite3.Row
+        _local.conn = conn
+        # Inode seen before connecting: if a swap happened in between we just reopen next time
+        _local.inode = inode
+
     return conn
 
 
+def get_db_generation(conn):
+    """Generation stamped by the ETL, None for databases built before it"""
+    try:
+        return conn.execute("SELECT MAX(generation) FROM db_generation").fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+
+
 # utilities and metadata
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -32,6 +116,43 @@ def health_check():
     })
 
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """
+    Readiness for load balancers: 503 until this worker has warmed up and
+    can read the trips table. /api/health only says the process is alive.
+    """
+    if not READY['warmed_up']:
+        return jsonify({"ready": False, "reason": "warming up"}), 503
+
+    conn = get_db_connection()
+    try:
+        conn.execute("SELECT 1 FROM trips LIMIT 1").fetchone()
+        generation = get_db_generation(conn)
+    except sqlite3.Error as e:
+        return jsonify({"ready": False, "reason": str(e)}), 503
+    finally:
+        conn.close()
+
+    return jsonify({"ready": True, "database_generation": generation})
+
+
+def warm_up():
+    """
+    Run the dashboard queries once before serving, so the database pages
+    are in the OS cache and this thread's connection is already open.
+    Returns the time it took in seconds.
+    """
+    started = time.perf_counter()
+    with app.test_client() as client:
+        for path in WARM_UP_PATHS:
+            response = client.get(path)
+            if response.status_code != 200:
+                print(f"Warm-up: {path} returned {response.status_code}")
+    READY['warmed_up'] = True
+    return time.perf_counter() - started
+
+
 @app.route('/api/zones', methods=['GET'])
 def get_zones():
     """Provides spatial metadata mapping LocationIDs to Borough/Zone names"""
@@ -42,18 +163,74 @@ def get_zones():
     return jsonify({row['LocationID']: {"Borough": row['Borough'], "Zone": row['Zone']} for row in zones})
 
 
+@app.route('/api/zones/geometry', methods=['GET'])
+def get_zone_geometry():
+    """
+    Serves taxi zone polygons at the level of detail the map needs.
+    Pass ?detail=low|medium|high|full or a map ?zoom=N to pick one.
+    """
+    detail = request.args.get('detail', None)
+    zoom = request.args.get('zoom', None, type=int)
+
+    if detail is None:
+        if zoom is None or zoom <= 10:
+            detail = 'low'
+        elif zoom <= 12:
+            detail = 'medium'
+        else:
+            detail = 'high'
+
+    if detail not in ZONE_DETAIL_LEVELS:
+        return jsonify({"error": f"Unknown detail level '{detail}'", "levels": ZONE_DETAIL_LEVELS}), 400
+
+    if detail == 'full':
+        geo_path = os.path.join(OUTPUT_DIR, 'taxi_zones.json')
+    else:
+        geo_path = os.path.join(OUTPUT_DIR, f'taxi_zones_{detail}.json')
+
+    if not os.path.exists(geo_path):
+        return jsonify({"error": "Zone geometry not found. Run scripts/convert_spacial.py"}), 404
+
+    # ETag + max-age let the browser reuse the file instead of downloading it again
+    response = send_file(geo_path, mimetype='application/geo+json',
+                         max_age=ZONE_CACHE_SECONDS, conditional=True, etag=True)
+    response.cache_control.public = True
+    return response
+
+
+@app.route('/api/zones/centroids', methods=['GET'])
+def get_zone_centroids():
+    """Precomputed centroid and bounding box for every zone"""
+    index_path = os.path.join(OUTPUT_DIR, 'taxi_zones_index.json')
+    if not os.path.exists(index_path):
+        return jsonify({"error": "Zone index not found. Run scripts/convert_spacial.py"}), 404
+
+    response = send_file(index_path, mimetype='application/json',
+                         max_age=ZONE_CACHE_SECONDS, conditional=True, etag=True)
+    response.cache_control.public = True
+    return response
+
+
 #
 
 @app.route('/api/stats/summary', methods=['GET'])
 def get_summary():
     """KPIs for the dashboard header"""
     conn = get_db_connection()
-    # Pulling total count and average revenue
-    stats = conn.execute("""
-                         SELECT COUNT(*)                    as total_trips,
-                                ROUND(AVG(total_amount), 2) as avg_fare
-                         FROM trips
-                         """).fetchone()
+    try:
+        # Counters kept by the ETL and /api/ingest, no scan of trips
+        stats = conn.execute("""
+                             SELECT COALESCE(SUM(trip_count), 0)              as total_trips,
+                                    ROUND(SUM(fare_sum) / SUM(trip_count), 2) as avg_fare
+                             FROM trip_stats
+                             """).fetchone()
+    except sqlite3.OperationalError:
+        # Pulling total count and average revenue (database built before trip_stats)
+        stats = conn.execute("""
+                             SELECT COUNT(*)                    as total_trips,
+                                    ROUND(AVG(total_amount), 2) as avg_fare
+                             FROM trips
+                             """).fetchone()
     conn.close()
     return jsonify(dict(stats))
 
@@ -62,14 +239,21 @@ def get_summary():
 def get_borough_distribution():
     """Returns trip counts per Borough for the bar Chart"""
     conn = get_db_connection()
-    query = """
-            SELECT z.Borough, COUNT(*) as trip_count
-            FROM trips t
-                     JOIN zones z ON t.PULocationID = z.LocationID
-            GROUP BY z.Borough
-            ORDER BY trip_count DESC \
-            """
-    data = conn.execute(query).fetchall()
+    try:
+        data = conn.execute("""
+                            SELECT borough as Borough, trip_count
+                            FROM trip_stats
+                            ORDER BY trip_count DESC
+                            """).fetchall()
+    except sqlite3.OperationalError:
+        query = """
+                SELECT z.Borough, COUNT(*) as trip_count
+                FROM trips t
+                         JOIN zones z ON t.PULocationID = z.LocationID
+                GROUP BY z.Borough
+                ORDER BY trip_count DESC \
+                """
+        data = conn.execute(query).fetchall()
     conn.close()
     return jsonify([dict(row) for row in data])
 
@@ -88,6 +272,74 @@ def get_time_efficiency():
     return jsonify([dict(row) for row in data])
 
 
+@app.route('/api/stats/percentiles', methods=['GET'])
+def get_percentiles():
+    """
+    Percentiles of fare, duration (minutes) or speed, merged from the sketches
+    the ETL stored per borough and time of day.
+    Example: /api/stats/percentiles?metric=fare&group_by=borough&q=0.5,0.9,0.99
+    """
+    started = time.perf_counter()
+    metric = request.args.get('metric', 'fare')
+    group_by = request.args.get('group_by', 'borough')
+    borough = request.args.get('borough', None)
+    time_of_day = request.args.get('time_of_day', None)
+
+    if metric not in ['fare', 'duration', 'speed']:
+        return jsonify({"error": "metric must be one of fare, duration, speed"}), 400
+    if group_by not in ['borough', 'time_of_day', 'all']:
+        return jsonify({"error": "group_by must be one of borough, time_of_day, all"}), 400
+    try:
+        fractions = [float(q) for q in request.args.get('q', '0.5,0.9,0.99').split(',')]
+    except ValueError:
+        return jsonify({"error": "q must be a comma separated list of fractions"}), 400
+    if any(q < 0 or q > 1 for q in fractions):
+        return jsonify({"error": "q values must be between 0 and 1"}), 400
+
+    query = "SELECT borough, time_of_day, kind, data FROM sketches WHERE metric IN (?, 'od_pairs')"
+    params = [metric]
+    if borough:
+        query += " AND borough = ?"
+        params.append(borough)
+    if time_of_day:
+        query += " AND time_of_day = ?"
+        params.append(time_of_day)
+
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(query, params).fetchall()
+    except sqlite3.OperationalError:
+        return jsonify({"error": "No sketches found. Run the ETL pipeline first."}), 404
+    finally:
+        conn.close()
+
+    # Merge the stored sketches into one per requested group
+    groups = {}
+    for row in rows:
+        key = 'all' if group_by == 'all' else row[group_by]
+        if key not in groups:
+            groups[key] = {'kll': KLLSketch(seed=0), 'hll': HyperLogLog()}
+        if row['kind'] == 'kll':
+            groups[key]['kll'].merge(KLLSketch.from_json(row['data']))
+        else:
+            groups[key]['hll'].merge(HyperLogLog.from_json(row['data']))
+
+    data = []
+    for key, sketches in groups.items():
+        entry = {group_by: key, "trips": sketches['kll'].count,
+                 "distinct_od_pairs": sketches['hll'].count()}
+        for q, value in zip(fractions, sketches['kll'].quantiles(fractions)):
+            entry[f"p{q * 100:g}"] = round(value, 2) if value is not None else None
+        data.append(entry)
+
+    return jsonify({
+        "metric": metric,
+        "algorithm": "KLL quantile sketch + HyperLogLog",
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        "data": data
+    })
+
+
 # raw data
 @app.route('/api/trips', methods=['GET'])
 def get_trips():
@@ -116,6 +368,157 @@ def get_trips():
     return jsonify([dict(row) for row in trips])
 
 
+def fetch_trips_by_id(conn, trip_ids, borough=None):
+    """Full trip rows (with borough names) for a list of ids, keyed by trip_id"""
+    trips = {}
+    borough_filter = " AND p.Borough = ?" if borough else ""
+    # Stay under SQLite's limit on query parameters
+    for i in range(0, len(trip_ids), 900):
+        chunk = trip_ids[i:i + 900]
+        placeholders = ','.join('?' * len(chunk))
+        params = list(chunk)
+        if borough:
+            params.append(borough)
+        rows = conn.execute(f"""
+            SELECT t.*, p.Borough as Pickup_Borough, d.Borough as Dropoff_Borough
+            FROM trips t
+                     JOIN zones p ON t.PULocationID = p.LocationID
+                     JOIN zones d ON t.DOLocationID = d.LocationID
+            WHERE t.trip_id IN ({placeholders}){borough_filter}
+            """, params).fetchall()
+        for row in rows:
+            trips[row['trip_id']] = dict(row)
+    return trips
+
+
+def borough_share(conn, borough):
+    """Fraction of all trips picked up in a borough, from the trip_stats counters"""
+    try:
+        rows = conn.execute("SELECT borough, trip_count FROM trip_stats").fetchall()
+    except sqlite3.OperationalError:
+        return 1.0  # no counters yet, probe as if every trip matched
+    total = sum(row['trip_count'] for row in rows)
+    matching = sum(row['trip_count'] for row in rows if row['borough'] == borough)
+    if total == 0:
+        return 1.0
+    return matching / total
+
+
+def probe_random_trips(conn, n, rng, borough=None):
+    """
+    Uniform sample by drawing random trip_ids between MIN and MAX and
+    keeping the ones that exist (and were picked up in `borough`, if given).
+    Uses the primary key, no table scan.
+    """
+    low, high = conn.execute("SELECT MIN(trip_id), MAX(trip_id) FROM trips").fetchone()
+    if low is None:
+        return []
+
+    # Only this share of the ids can match, so draw that many more per round
+    share = borough_share(conn, borough) if borough else 1.0
+    if share == 0:
+        return []
+
+    sample = []
+    tried = set()
+    for _ in range(10):
+        wanted = n - len(sample)
+        if wanted <= 0 or len(tried) > high - low:
+            break
+        candidates = []
+        for _ in range(min(int(wanted * 2 / share), MAX_PROBES_PER_ROUND)):
+            trip_id = rng.randint(low, high)
+            if trip_id not in tried:
+                tried.add(trip_id)
+                candidates.append(trip_id)
+
+        # Gaps (deleted ids) and trips from other boroughs simply do not come back
+        found = fetch_trips_by_id(conn, candidates, borough)
+        for trip_id in candidates:
+            if trip_id in found and len(sample) < n:
+                sample.append(found[trip_id])
+    return sample
+
+
+@app.route('/api/trips/sample', methods=['GET'])
+def get_trip_sample():
+    """
+    Representative random trips instead of the first N rows.
+    ?n=100&seed=7 gives the same trips every time for the same seed.
+    ?stratify=borough|hour draws evenly from every borough or pickup hour.
+    """
+    n = request.args.get('n', 100, type=int)
+    seed = request.args.get('seed', None, type=int)
+    stratify = request.args.get('stratify', 'none')
+    borough = request.args.get('borough', None)
+
+    if stratify not in ['none', 'borough', 'hour']:
+        return jsonify({"error": "stratify must be one of none, borough, hour"}), 400
+    n = max(1, min(n, 5000))
+    if seed is None:
+        seed = random.randrange(2 ** 31)
+
+    conn = get_db_connection()
+    try:
+        if stratify == 'none':
+            method = "Random trip_id probing"
+            trips = probe_random_trips(conn, n, random.Random(seed), borough)
+        else:
+            method = "Reservoir sampling (Algorithm L) over the precomputed stratified sample"
+            query = "SELECT trip_id, borough, hour FROM trip_samples"
+            params = []
+            if borough:
+                query += " WHERE borough = ?"
+                params.append(borough)
+            query += " ORDER BY trip_id"  # fixed input order keeps seeds reproducible
+            try:
+                candidates = [dict(row) for row in conn.execute(query, params).fetchall()]
+                populations = {}
+                for row in conn.execute("SELECT borough, hour, population FROM trip_sample_cells"):
+                    populations[(row['borough'], row['hour'])] = row['population']
+            except sqlite3.OperationalError:
+                return jsonify({"error": "No trip sample found. Run the ETL pipeline first."}), 404
+
+            # The ETL keeps up to 200 trips per (borough, hour) cell, whatever the cell's size.
+            # whatever the cell's size. Split n evenly over the groups present, then
+            # inside a group over its cells in proportion to how many trips each really has.
+            cell_sizes = {}
+            for row in candidates:
+                row['cell'] = (row['borough'], row['hour'])
+                cell_sizes[row['cell']] = cell_sizes.get(row['cell'], 0) + 1
+            group_sizes = {}
+            for row in candidates:
+                group_sizes[row[stratify]] = group_sizes.get(row[stratify], 0) + 1
+
+            cell_quotas = {}
+            group_position = 0 if stratify == 'borough' else 1
+            for group, group_quota in split_evenly(group_sizes, n).items():
+                weights = {}
+                for cell in cell_sizes:
+                    if cell[group_position] == group:
+                        weights[cell] = populations.get(cell, 0)
+                cell_quotas.update(split_by_weight(weights, cell_sizes, group_quota))
+
+            cells = stratified_sample(candidates, 'cell', cell_quotas, seed=seed)
+            chosen = []
+            for cell in sorted(cells, key=lambda cell: (cell[group_position], cell)):
+                chosen.extend(cells[cell])
+
+            trip_ids = [row['trip_id'] for row in chosen]
+            found = fetch_trips_by_id(conn, trip_ids)
+            trips = [found[trip_id] for trip_id in trip_ids if trip_id in found]
+
+        return jsonify({
+            "seed": seed,
+            "stratify": stratify,
+            "method": method,
+            "count": len(trips),
+            "data": trips
+        })
+    finally:
+        conn.close()
+
+
 @app.route('/api/analytics/summary', methods=['GET'])
 def get_analytics_summary():
     conn = get_db_connection()
@@ -153,7 +556,7 @@ def get_data_quality():
         valid_records = conn.execute("SELECT COUNT(*) FROM trips").fetchone()[0]
 
         # 2. Get Rejected Records
-        log_path = os.path.join(BASE_DIR, 'output', 'suspicious_records.log')
+        log_path = os.path.join(OUTPUT_DIR, 'suspicious_records.log')
 
         # Debugging
         print(f"DEBUG: Looking for log at {log_path}")
@@ -163,12 +566,12 @@ def get_data_quality():
 
         if os.path.exists(log_path):
             try:
-                # Read the log file
-                df_log = pd.read_csv(log_path)
-                rejected_records = len(df_log)
-
-                # Count by specific reason
-                counts = df_log['rejection_reason'].value_counts()
+                # Read the log file with the csv module: importing pandas here would
+                # load it separately in every forked worker during warm-up
+                with open(log_path, newline='') as f:
+                    # Count by specific reason
+                    counts = Counter(row['rejection_reason'] for row in csv.DictReader(f))
+                rejected_records = sum(counts.values())
 
                 # Map the log counts to the Dashboard format
                 issues = [
@@ -231,6 +634,49 @@ def get_data_quality():
         conn.close()
 
 
+# live ingestion
+ingestor = MicroBatchIngestor(DB_PATH, os.path.join(OUTPUT_DIR, 'ingest_rejects.log'),
+                              INGEST_BATCH_SIZE, INGEST_MAX_LATENCY, INGEST_MAX_PENDING)
+
+
+def shut_down():
+    """Called by serve.py when a worker is stopped: write out buffered ingest rows"""
+    ingestor.stop()
+
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_trips():
+    """
+    Accepts newline-delimited JSON trip records (one object per line).
+    Good rows are written within INGEST_MAX_LATENCY seconds; rejects are
+    returned with their reason and logged to output/ingest_rejects.log.
+    """
+    body = request.get_data(as_text=True)
+    # Count records the way submit() does: blank lines (e.g. a trailing newline) are not records
+    record_count = sum(1 for line in body.splitlines() if line.strip())
+    if record_count > INGEST_MAX_RECORDS:
+        return jsonify({"error": f"At most {INGEST_MAX_RECORDS} records per request"}), 413
+
+    try:
+        accepted, rejects = ingestor.submit(body)
+    except IngestBackpressure as e:
+        response = jsonify({"error": "Ingest buffer full, retry later", "detail": str(e)})
+        response.headers['Retry-After'] = str(max(1, math.ceil(INGEST_MAX_LATENCY)))
+        return response, 429
+
+    return jsonify({
+        "accepted": accepted,
+        "rejected": len(rejects),
+        "rejects": [{"line": r['line'], "reason": r['reason']} for r in rejects[:100]]
+    }), 202
+
+
+@app.route('/api/ingest/stats', methods=['GET'])
+def get_ingest_stats():
+    """Ingest counters and the sustained commit rate for this worker"""
+    return jsonify(ingestor.report())
+
+
 # New endpoints using costum algorithms
 
 @app.route('/api/trips/custom-sort', methods=['GET'])
@@ -238,6 +684,11 @@ def get_custom_sorted_trips():
     sort_by = request.args.get('sort_by', 'total_amount')
     limit = request.args.get('limit', 10, type=int)
     borough = request.args.get('borough', None)  # Capture the filter
+    pool = request.args.get('pool', 1000, type=int)  # How many trips to sort through
+
+    if sort_by not in ['total_amount', 'trip_distance', 'speed']:
+        return jsonify({"error": "sort_by must be one of total_amount, trip_distance, speed"}), 400
+    pool = max(1, min(pool, MAX_CUSTOM_POOL))
 
     conn = get_db_connection()
 
@@ -260,26 +711,26 @@ def get_custom_sorted_trips():
         query += " WHERE z.Borough = ?"
         params.append(borough)
 
-    query += " LIMIT 1000"  # Keep limit for Bubble Sort performance
-
-    results = conn.execute(query, params).fetchall()
-    conn.close()
-
-    trips_list = []
-    for row in results:
-        trips_list.append({
-            'trip_id': row['trip_id'],
-            'total_amount': row['total_amount'],
-            'trip_distance': row['trip_distance'],
-            'pickup_time': row['tpep_pickup_datetime'],
-            'pickup_location': row['PULocationID'],
-            'dropoff_location': row['DOLocationID'],
-            'speed': row['average_speed_mph'],
-            'pickup_borough': row['Borough']  # Sending the actual name
+    query += " LIMIT ?"
+    params.append(pool)
+
+    # Column storage: one array per field instead of one dict per trip,
+    # filled straight from the cursor
+    trips = TripColumns.from_rows(
+        conn.execute(query, params),
+        {'total_amount': 'total_amount', 'trip_distance': 'trip_distance', 'speed': 'average_speed_mph'},
+        {
+            'trip_id': 'trip_id',
+            'pickup_time': 'tpep_pickup_datetime',
+            'pickup_location': 'PULocationID',
+            'dropoff_location': 'DOLocationID',
+            'pickup_borough': 'Borough'  # Sending the actual name
         })
+    conn.close()
 
-    sorted_trips = sort_trips_descending(trips_list, sort_by)
-    return jsonify({"data": sorted_trips[:limit]})
+    # Only the first `limit` rows are returned, so select them instead of sorting everything
+    order = top_n_indices(trips.column(sort_by), limit)
+    return jsonify({"data": trips.rows(order)})
 
 @app.route('/api/trips/top-expensive', methods=['GET'])
 def get_top_expensive_trips():
@@ -288,6 +739,8 @@ def get_top_expensive_trips():
     """
 
     n = request.args.get('n', 10, type=int)
+    pool = request.args.get('pool', 5000, type=int)
+    pool = max(1, min(pool, MAX_CUSTOM_POOL))
 
     conn = get_db_connection()
 
@@ -295,26 +748,22 @@ def get_top_expensive_trips():
     trips = conn.execute("""
                          SELECT trip_id, total_amount, trip_distance, tpep_pickup_datetime
                          FROM trips
-                         LIMIT 5000
-                         """).fetchall()
+                         LIMIT ?
+                         """, (pool,))
+
+    # Convert to columns
+    trip_columns = TripColumns.from_rows(
+        trips,
+        {'total_amount': 'total_amount', 'trip_distance': 'trip_distance'},
+        {'trip_id': 'trip_id', 'pickup_time': 'tpep_pickup_datetime'})
     conn.close()
 
-    # Convert to list
-    trips_list = []
-    for trip in trips:
-        trips_list.append({
-            'trip_id': trip['trip_id'],
-            'total_amount': trip['total_amount'],
-            'trip_distance': trip['trip_distance'],
-            'pickup_time': trip['tpep_pickup_datetime']
-        })
-
-    # Use custom function to find top N
-    top_trips = find_top_n(trips_list, 'total_amount', n)
+    # Use custom heap selection to find top N
+    top_trips = trip_columns.rows(top_n_indices(trip_columns.column('total_amount'), n))
 
     return jsonify({
         "message": f"Top {n} most expensive trips",
-        "algorithm_used": "Custom sorting + selection",
+        "algorithm_used": "Custom heap selection over column arrays",
         "data": top_trips
     })
 
@@ -325,6 +774,9 @@ def get_borough_stats_custom():
     Calculate borough statistics using CUSTOM GROUPING
     """
 
+    pool = request.args.get('pool', 10000, type=int)
+    pool = max(1, min(pool, MAX_CUSTOM_POOL))
+
     conn = get_db_connection()
 
     # Get raw data without grouping in SQL
@@ -332,22 +784,16 @@ def get_borough_stats_custom():
             SELECT z.Borough, t.total_amount
             FROM trips t
                      JOIN zones z ON t.PULocationID = z.LocationID
-            LIMIT 10000 \
+            LIMIT ? \
             """
 
-    results = conn.execute(query).fetchall()
+    # Convert to columns
+    results = conn.execute(query, (pool,))
+    trips_with_borough = TripColumns.from_rows(results, {'total_amount': 'total_amount'}, {'borough': 'Borough'})
     conn.close()
 
-    # Convert to simple list
-    trips_with_borough = []
-    for row in results:
-        trips_with_borough.append({
-            'borough': row['Borough'],
-            'total_amount': row['total_amount']
-        })
-
     # Use CUSTOM GROUPING FUNCTION
-    averages = calculate_average_by_group(trips_with_borough, 'borough', 'total_amount')
+    averages = column_average_by_group(trips_with_borough, 'borough', 'total_amount')
 
     # Format the response
     result_list = []
@@ -368,17 +814,27 @@ if __name__ == '__main__':
     print("API Server running at http://127.0.0.1:5000\n")
     print("--- Utilities and Metadata ---")
     print("  - GET /api/health")
+    print("  - GET /api/ready")
     print("  - GET /api/zones")
+    print("  - GET /api/zones/geometry")
+    print("  - GET /api/zones/centroids")
     print("\n--- Dashboard Stats ---")
     print("  - GET /api/stats/summary")
     print("  - GET /api/stats/charts/boroughs")
     print("  - GET /api/stats/charts/efficiency")
     print("  - GET /api/stats/quality")
+    print("  - GET /api/stats/percentiles")
     print("\n--- Raw Data and Analytics ---")
     print("  - GET /api/trips")
+    print("  - GET /api/trips/sample")
     print("  - GET /api/analytics/summary")
+    print("\n--- Live Ingestion ---")
+    print("  - POST /api/ingest")
+    print("  - GET /api/ingest/stats")
     print("\n--- Custom Algorithms ---")
     print("  - GET /api/trips/custom-sort")
     print("  - GET /api/trips/top-expensive")
     print("  - GET /api/analytics/borough-custom\n")
+    print("Development server only. Use `python serve.py` for multiple workers.\n")
+    warm_up()
     app.run(debug=True, port=5000)
\ No newline at end of file
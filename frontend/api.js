@@ -10,6 +10,8 @@ const API = {
             return null;
         }
     },
+    getZoneGeometry: (zoom = 10) => API.call(`/zones/geometry?zoom=${zoom}`),
+    getZoneCentroids: () => API.call('/zones/centroids'),
     getSummary: () => API.call('/stats/summary'),
     getQuality: () => API.call('/stats/quality'),
     getBoroughDist: () => API.call('/stats/charts/boroughs'),
@@ -0,0 +1,379 @@
+"""
+Live trip ingestion for POST /api/ingest.
+
+Records are checked with the same rules as the batch ETL (validation.py),
+then buffered and written by a background thread in micro-batches: each
+batch is inserted and added to the trip_stats counters in one transaction.
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Fields a record needs before the validation rules can even be applied
+REQUIRED_FIELDS = ['tpep_pickup_datetime', 'tpep_dropoff_datetime', 'trip_distance',
+                   'total_amount', 'PULocationID', 'DOLocationID']
+# NOT NULL columns of the trips table that the rules do not already cover
+NOT_NULL_FIELDS = ['VendorID']
+NUMERIC_FIELDS = ['VendorID', 'passenger_count', 'trip_distance', 'RatecodeID', 'PULocationID',
+                  'DOLocationID', 'payment_type', 'fare_amount', 'extra', 'mta_tax', 'tip_amount',
+                  'tolls_amount', 'improvement_surcharge', 'total_amount', 'congestion_surcharge']
+
+# A batch that can not be written is retried with a doubling wait: a ranged ETL run
+# holds the database for the whole copy of the file, longer than one lock timeout
+WRITE_ATTEMPTS = 6
+FIRST_RETRY_DELAY = 1.0  # seconds
+MAX_RETRY_DELAY = 30.0
+
+
+class IngestBackpressure(Exception):
+    """Raised when the buffer is too full to take a batch, the client should retry later"""
+
+
+class MicroBatchIngestor:
+    """
+    Buffer of validated trip rows and the thread that writes them out.
+    A batch is written when batch_size rows are waiting or the oldest row
+    has waited max_latency seconds, whichever comes first.
+    """
+
+    def __init__(self, db_path, reject_log, batch_size=5000, max_latency=1.0, max_pending=100000):
+        self.db_path = db_path
+        self.reject_log = reject_log
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.max_pending = max_pending
+
+        self.pending = []
+        self.oldest = None
+        self.condition = threading.Condition()
+        self.log_lock = threading.Lock()
+        self.thread = None
+        self.stopping = False
+
+        self.stats = {
+            'rows_received': 0,
+            'rows_rejected': 0,
+            'rows_committed': 0,
+            'rows_failed': 0,
+            'batches_committed': 0,
+            'last_batch_ms': None,
+            'first_commit_at': None,
+            'last_commit_at': None,
+        }
+
+    # --- request side ---
+
+    def submit(self, body):
+        """
+        Parse an NDJSON body, validate it and queue the good rows.
+        Returns (accepted count, list of rejects with their reasons).
+        """
+        records = []
+        rejects = []
+        for line_number, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                rejects.append({"line": line_number, "reason": "Invalid JSON", "record": line})
+                continue
+            if not isinstance(record, dict):
+                rejects.append({"line": line_number, "reason": "Invalid JSON", "record": line})
+                continue
+
+            missing = [field for field in REQUIRED_FIELDS if record.get(field) is None]
+            if missing:
+                rejects.append({"line": line_number, "reason": "Missing Fields", "record": record})
+                continue
+            records.append((line_number, record))
+
+        rows = []
+        if records:
+            rows, rule_rejects = self.validate(records)
+            rejects.extend(rule_rejects)
+
+        with self.condition:
+            if self.stopping:
+                raise IngestBackpressure("server is shutting down")
+            if len(self.pending) + len(rows) > self.max_pending:
+                raise IngestBackpressure(f"{len(self.pending)} rows already waiting to be written")
+
+            self.stats['rows_received'] += len(rows) + len(rejects)
+            self.stats['rows_rejected'] += len(rejects)
+            if rows:
+                if not self.pending:
+                    self.oldest = time.monotonic()
+                self.pending.extend(rows)
+                self.start()
+                self.condition.notify()
+
+        self.log_rejects(rejects)
+        return len(rows), rejects
+
+    def validate(self, records):
+        """Vectorized ETL rules over the whole request, returns (rows to insert, rejects)"""
+        # pandas is slow to import, so only load it once ingestion is used
+        import pandas as pd
+        from validation import COLS_TO_SAVE, add_derived_columns, find_suspicious, prepare_clean
+
+        record_by_line = dict(records)
+        df = pd.DataFrame(list(record_by_line.values()), index=list(record_by_line.keys()))
+        for field in NUMERIC_FIELDS:
+            if field in df.columns:
+                df[field] = pd.to_numeric(df[field], errors='coerce')
+        df['tpep_pickup_datetime'] = pd.to_datetime(df['tpep_pickup_datetime'], errors='coerce')
+        df['tpep_dropoff_datetime'] = pd.to_datetime(df['tpep_dropoff_datetime'], errors='coerce')
+
+        # Values that could not be parsed would slip through the rules (NaN > 50 is False)
+        mask_malformed = df[REQUIRED_FIELDS].isna().any(axis=1)
+
+        # NULL in a NOT NULL column would make SQLite refuse the row at insert time
+        mask_null = pd.Series(False, index=df.index)
+        null_reasons = {}
+        for field in NOT_NULL_FIELDS:
+            if field in df.columns:
+                missing = df[field].isna()
+            else:
+                missing = pd.Series(True, index=df.index)
+            for line_number in df.index[missing & ~mask_malformed & ~mask_null]:
+                null_reasons[line_number] = f"Missing {field}"
+            mask_null = mask_null | missing
+
+        valid_zones, zone_boroughs = self.load_zones()
+        df = add_derived_columns(df)
+        mask_suspicious, reasons = find_suspicious(df, valid_zones)
+
+        rejects = []
+        for line_number in df.index[mask_malformed]:
+            rejects.append({"line": int(line_number), "reason": "Malformed Values",
+                            "record": record_by_line[line_number]})
+        for line_number, reason in null_reasons.items():
+            rejects.append({"line": int(line_number), "reason": reason,
+                            "record": record_by_line[line_number]})
+        for line_number, reason in reasons.items():
+            if not (mask_malformed[line_number] or mask_null[line_number]):
+                rejects.append({"line": int(line_number), "reason": reason,
+                                "record": record_by_line[line_number]})
+
+        df_clean = prepare_clean(df[~(mask_suspicious | mask_malformed | mask_null)].copy())
+        if df_clean.empty:
+            return [], rejects
+
+        # Same text format the ETL stores through to_sql
+        df_clean['tpep_pickup_datetime'] = df_clean['tpep_pickup_datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        df_clean['tpep_dropoff_datetime'] = df_clean['tpep_dropoff_datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        df_clean['time_of_day'] = df_clean['time_of_day'].astype(str)
+
+        table = df_clean[COLS_TO_SAVE].astype(object)
+        table = table.where(pd.notna(table), None)
+        boroughs = df_clean['PULocationID'].map(zone_boroughs).fillna('Unknown').tolist()
+
+        fare_position = COLS_TO_SAVE.index('total_amount')
+        rows = []
+        for values, borough in zip(table.itertuples(index=False, name=None), boroughs):
+            rows.append((values, borough, values[fare_position]))
+        return rows, rejects
+
+    def load_zones(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            zones = conn.execute("SELECT LocationID, Borough FROM zones").fetchall()
+        except sqlite3.OperationalError:
+            zones = []
+        finally:
+            conn.close()
+        return set(row[0] for row in zones), dict(zones)
+
+    def log_rejects(self, rejects):
+        """Append rejects to the log as one JSON object per line"""
+        if not rejects:
+            return
+        received_at = datetime.now().isoformat()
+        with self.log_lock:
+            os.makedirs(os.path.dirname(self.reject_log), exist_ok=True)
+            with open(self.reject_log, 'a') as f:
+                for reject in rejects:
+                    f.write(json.dumps({"received_at": received_at, "rejection_reason": reject['reason'],
+                                        "record": reject['record']}, default=str) + "\n")
+
+    # --- writer side ---
+
+    def start(self):
+        """Start the writer thread on first use (after the server has forked)"""
+        if self.thread is None:
+            atexit.register(self.stop)
+        # Also replaces a writer that died, rather than letting pending fill up for good
+        if self.thread is None or not self.thread.is_alive():
+            # Daemon so it never blocks interpreter exit; stop() is what flushes the buffer
+            self.thread = threading.Thread(target=self.run, name='ingest-writer', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=30):
+        """Write out every row still buffered, then end the writer thread"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def next_batch(self):
+        """
+        Wait until a batch is full or the oldest row is due, then take it.
+        Once stopping, batches go out right away and None means all done.
+        """
+        with self.condition:
+            while not self.pending and not self.stopping:
+                self.condition.wait()
+            if not self.pending:
+                return None
+
+            deadline = self.oldest + self.max_latency
+            while len(self.pending) < self.batch_size and not self.stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            batch = self.pending[:self.batch_size]
+            del self.pending[:self.batch_size]
+            self.oldest = time.monotonic() if self.pending else None
+            return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            try:
+                rejects = self.write_with_retry(batch)
+            except Exception as e:
+                # The rows were already accepted with 202, so they at least go to the log
+                print(f"Ingest Error: giving up on {len(batch)} rows: {e}")
+                self.log_failed_batch(batch, e)
+                with self.condition:
+                    self.stats['rows_failed'] += len(batch)
+                continue
+
+            now = time.time()
+            with self.condition:
+                self.stats['rows_committed'] += len(batch) - len(rejects)
+                self.stats['rows_rejected'] += len(rejects)
+                self.stats['batches_committed'] += 1
+                self.stats['last_batch_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                if self.stats['first_commit_at'] is None:
+                    self.stats['first_commit_at'] = now
+                self.stats['last_commit_at'] = now
+            self.log_batch_rejects(rejects)
+
+    def write_with_retry(self, batch):
+        """write(), retried with a growing wait; raises the last error once every attempt failed"""
+        delay = FIRST_RETRY_DELAY
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                return self.write(batch)
+            except Exception as e:
+                # Any error, not only sqlite3.Error (e.g. the file missing mid-swap)
+                if attempt == WRITE_ATTEMPTS:
+                    raise
+                print(f"Ingest Error: could not write {len(batch)} rows ({e}), retrying in {delay:.0f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    def log_failed_batch(self, batch, error):
+        from validation import COLS_TO_SAVE
+
+        rejects = []
+        for values, _, _ in batch:
+            rejects.append({"reason": f"Write Failed: {error}", "record": dict(zip(COLS_TO_SAVE, values))})
+        self.log_batch_rejects(rejects)
+
+    def log_batch_rejects(self, rejects):
+        """log_rejects() from the writer thread, which must not die on a full disk"""
+        try:
+            self.log_rejects(rejects)
+        except OSError as e:
+            print(f"Ingest Error: could not log {len(rejects)} rows: {e}")
+
+    def connect_for_write(self):
+        """
+        New connection holding the write lock. A new connection per batch also
+        picks up a database swapped in by the ETL, which holds the lock on the
+        old file while it renames: if we were waiting on it, reconnect.
+        """
+        while True:
+            inode = os.stat(self.db_path).st_ino
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.Error:
+                conn.close()
+                raise
+            if os.stat(self.db_path).st_ino == inode:
+                return conn
+            conn.close()
+
+    def write(self, batch):
+        """
+        Insert one micro-batch and update the borough counters in a single transaction.
+        If SQLite refuses a row, the batch is redone one row at a time so only the
+        refused rows are left out; those are returned as rejects.
+        """
+        from validation import COLS_TO_SAVE
+
+        insert_sql = f"INSERT INTO trips ({','.join(COLS_TO_SAVE)}) VALUES ({','.join('?' * len(COLS_TO_SAVE))})"
+        conn = self.connect_for_write()
+        try:
+            written = batch
+            rejects = []
+            conn.execute("SAVEPOINT batch")
+            try:
+                conn.executemany(insert_sql, [values for values, _, _ in batch])
+            except sqlite3.IntegrityError:
+                # executemany stops at the first bad row, undo it and go row by row
+                conn.execute("ROLLBACK TO batch")
+                written = []
+                for row in batch:
+                    try:
+                        conn.execute(insert_sql, row[0])
+                        written.append(row)
+                    except sqlite3.IntegrityError as e:
+                        rejects.append({"reason": f"Database Error: {e}", "record": dict(zip(COLS_TO_SAVE, row[0]))})
+            conn.execute("RELEASE batch")
+
+            counts = {}
+            fares = {}
+            for _, borough, fare in written:
+                counts[borough] = counts.get(borough, 0) + 1
+                fares[borough] = fares.get(borough, 0) + (fare or 0)
+            conn.executemany("""
+                INSERT INTO trip_stats (borough, trip_count, fare_sum) VALUES (?, ?, ?)
+                ON CONFLICT(borough) DO UPDATE SET trip_count = trip_count + excluded.trip_count,
+                                                   fare_sum   = fare_sum + excluded.fare_sum
+                """, [(borough, counts[borough], fares[borough]) for borough in counts])
+            conn.commit()
+        finally:
+            conn.close()
+        return rejects
+
+    def report(self):
+        """Counters plus the sustained commit rate since the first batch"""
+        with self.condition:
+            report = dict(self.stats)
+            report['rows_pending'] = len(self.pending)
+
+        if report['first_commit_at'] and report['last_commit_at'] > report['first_commit_at']:
+            elapsed = report['last_commit_at'] - report['first_commit_at']
+            report['rows_per_second'] = round(report['rows_committed'] / elapsed, 1)
+        else:
+            report['rows_per_second'] = None
+        report['batch_size'] = self.batch_size
+        report['max_latency_seconds'] = self.max_latency
+        report['max_pending'] = self.max_pending
+        return report
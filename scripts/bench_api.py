@@ -0,0 +1,99 @@
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+SERVE_SCRIPT = os.path.join(PROJECT_ROOT, 'serve.py')
+
+DEFAULT_PATHS = ['/api/stats/summary', '/api/stats/charts/boroughs', '/api/zones']
+
+
+def wait_until_ready(base_url, timeout=120):
+    """Poll /api/ready until a warmed-up worker answers 200, return seconds waited"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(base_url + '/api/ready', timeout=2) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"Server not ready after {timeout}s")
+
+
+def load_test(base_url, paths, concurrency, duration):
+    """Hammer the paths from several threads and return (requests, errors, seconds)"""
+    counts = {'ok': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        ok = 0
+        errors = 0
+        i = offset
+        while time.perf_counter() < deadline:
+            url = base_url + paths[i % len(paths)]
+            i = i + 1
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+                    ok = ok + 1
+            except (urllib.error.URLError, ConnectionError, OSError):
+                errors = errors + 1
+        with lock:
+            counts['ok'] = counts['ok'] + ok
+            counts['errors'] = counts['errors'] + errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts['ok'], counts['errors'], time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure API cold start and requests per second")
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--path', action='append', dest='paths', help="endpoint to request (repeatable)")
+    parser.add_argument('--no-start', action='store_true', help="benchmark a server that is already running")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    paths = args.paths or DEFAULT_PATHS
+    server = None
+
+    try:
+        if not args.no_start:
+            print(f"Starting serve.py with {args.workers} worker(s) x {args.threads} thread(s)...")
+            server = subprocess.Popen([sys.executable, SERVE_SCRIPT, '--port', str(args.port),
+                                       '--workers', str(args.workers), '--threads', str(args.threads)],
+                                      cwd=PROJECT_ROOT)
+        cold_start = wait_until_ready(base_url)
+        if server is not None:
+            print(f"Cold start (launch -> ready): {cold_start:.2f}s")
+
+        print(f"Load test: {args.concurrency} clients for {args.duration:.0f}s on {', '.join(paths)}")
+        ok, errors, seconds = load_test(base_url, paths, args.concurrency, args.duration)
+
+        rps = ok / seconds
+        cores = min(args.workers, os.cpu_count() or 1)
+        print(f"Requests: {ok} ok, {errors} failed")
+        print(f"Throughput: {rps:.0f} req/s ({rps / cores:.0f} req/s per core, {cores} core(s))")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
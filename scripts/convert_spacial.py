@@ -1,11 +1,64 @@
 import geopandas as gpd
+import shapely
+import json
 import os
 
 # --- CONFIGURATION ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
 SHP_FILE = os.path.join(PROJECT_ROOT, 'data', 'taxi_zones', 'taxi_zones.shp')
-OUTPUT_FILE = os.path.join(PROJECT_ROOT, 'output', 'taxi_zones.json')
+OUTPUT_DIR = os.path.join(PROJECT_ROOT, 'output')
+OUTPUT_FILE = os.path.join(OUTPUT_DIR, 'taxi_zones.json')
+INDEX_FILE = os.path.join(OUTPUT_DIR, 'taxi_zones_index.json')
+
+# Level of detail -> (simplify tolerance in source CRS units, decimal places kept)
+# The taxi_zones shapefile is in EPSG:2263 so the tolerance is in feet.
+# 5 decimals of a degree is about 1 meter, which is finer than any screen pixel.
+DETAIL_LEVELS = {
+    'low': (400, 4),      # whole city view (zoom <= 10)
+    'medium': (100, 5),   # borough view (zoom 11-12)
+    'high': (20, 5),      # neighbourhood view (zoom >= 13)
+}
+
+
+def detail_file(level):
+    """Path of the GeoJSON file for one level of detail"""
+    return os.path.join(OUTPUT_DIR, f'taxi_zones_{level}.json')
+
+
+def simplify_zones(gdf, tolerance):
+    """
+    Simplify every zone while keeping shared borders identical, so
+    neighbouring zones never get gaps or overlaps between them.
+    """
+    simplified = gdf.copy()
+    geoms = shapely.make_valid(gdf.geometry.values)
+    simplified.geometry = shapely.coverage_simplify(geoms, tolerance)
+    return simplified
+
+
+def quantize_zones(gdf, decimals):
+    """Snap coordinates to a fixed grid so the GeoJSON text stays short"""
+    quantized = gdf.copy()
+    quantized.geometry = shapely.set_precision(gdf.geometry.values, 10 ** -decimals)
+    return quantized
+
+
+def build_zone_index(gdf):
+    """Precompute centroid and bounding box per zone from the full geometry"""
+    # Centroids are computed in the projected CRS, then moved to Lat/Lon
+    centroids = gdf.geometry.centroid.to_crs("EPSG:4326")
+    bounds = gdf.to_crs("EPSG:4326").geometry.bounds
+
+    index = {}
+    for i, row in gdf.iterrows():
+        index[int(row['LocationID'])] = {
+            "Borough": row['borough'],
+            "Zone": row['zone'],
+            "centroid": [round(centroids[i].x, 5), round(centroids[i].y, 5)],
+            "bbox": [round(v, 5) for v in bounds.loc[i].tolist()]
+        }
+    return index
 
 
 def convert_shapefile():
@@ -17,20 +70,43 @@ def convert_shapefile():
         print(" Make sure you moved the 'taxi_zones' folder into 'data'")
         return
 
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
+
     try:
         # Read the Shapefile
         print("   Reading Shapefile...")
         gdf = gpd.read_file(SHP_FILE)
 
+        # Centroids and bounding boxes
+        print("   Computing centroids and bounding boxes...")
+        with open(INDEX_FILE, 'w') as f:
+            json.dump(build_zone_index(gdf), f, separators=(',', ':'))
+
+        # Simplified levels of detail (simplify before reprojecting, tolerance is in feet)
+        for level, (tolerance, decimals) in DETAIL_LEVELS.items():
+            print(f"   Building '{level}' level (tolerance={tolerance}, decimals={decimals})...")
+            level_gdf = simplify_zones(gdf, tolerance).to_crs("EPSG:4326")
+            level_gdf = quantize_zones(level_gdf, decimals)
+            level_gdf.to_file(detail_file(level), driver="GeoJSON",
+                              COORDINATE_PRECISION=decimals, WRITE_BBOX="YES")
+
         # Convert Coordinate Reference System (CRS)
         if gdf.crs and gdf.crs.to_string() != 'EPSG:4326':
             print("   Converting coordinates to Lat/Lon (EPSG:4326)...")
             gdf = gdf.to_crs("EPSG:4326")
 
-        # Save as GeoJSON
+        # Save the full resolution GeoJSON
         print(f"   Saving to {OUTPUT_FILE}...")
         gdf.to_file(OUTPUT_FILE, driver="GeoJSON")
 
+        # Payload size report
+        full_size = os.path.getsize(OUTPUT_FILE)
+        print(f"   full:   {full_size / 1024:.0f} KB")
+        for level in DETAIL_LEVELS:
+            size = os.path.getsize(detail_file(level))
+            print(f"   {level + ':':<7} {size / 1024:.0f} KB ({full_size / size:.1f}x smaller)")
+
         print("Success! Map data is ready for the Frontend.")
 
     except Exception as e:
@@ -38,4 +114,4 @@ def convert_shapefile():
 
 
 if __name__ == "__main__":
-    convert_shapefile()
\ No newline at end of file
+    convert_shapefile()
@@ -1,21 +1,370 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import argparse
 import os
+import sys
 import sqlite3
-import numpy as np
+from datetime import datetime
+
+from geocode import geocode_trips, RAW_COORD_COLUMNS
 
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
+
+# algorithms.py lives in the project root
+sys.path.append(PROJECT_ROOT)
+from algorithms import KLLSketch, HyperLogLog, reservoir_sample
+from validation import COLS_TO_SAVE, DERIVED_COLS, add_derived_columns, find_suspicious, prepare_clean
+
 DB_PATH = os.path.join(PROJECT_ROOT, "database.db")
-TRIPS_FILE = os.path.join(PROJECT_ROOT, 'data', 'yellow_tripdata_2019-01.parquet')
-# TRIPS_FILE = os.path.join(PROJECT_ROOT, 'data', 'yellow_tripdata_2019-01.csv')
+# The ETL builds here and then renames the file over DB_PATH in one step
+SHADOW_DB_PATH = DB_PATH + '.shadow'
+# Hive-partitioned dataset (data/trips/year=2019/month=1/...), or a single .parquet/.csv file
+TRIPS_PATH = os.path.join(PROJECT_ROOT, 'data', 'trips')
+# TRIPS_PATH = os.path.join(PROJECT_ROOT, 'data', 'yellow_tripdata_2019-01.parquet')
 ZONE_FILE = os.path.join(PROJECT_ROOT, 'data', 'taxi_zone_lookup.csv')
-TRIPS_FILE = os.path.join(PROJECT_ROOT, 'data', 'yellow_tripdata_2019-01.parquet')
 LOG_DIR = os.path.join(PROJECT_ROOT, 'output')
 LOG_FILE = os.path.join(LOG_DIR, 'suspicious_records.log')
 
+# Quantile sketches kept per borough and time_of_day (served by /api/stats/percentiles)
+SKETCH_METRICS = ['fare', 'duration', 'speed']
+
+# Trips kept per (pickup borough, pickup hour) for /api/trips/sample
+SAMPLES_PER_STRATUM = 200
+SAMPLE_SEED = 42
+
+
+def _pickup_bound(value, field_type):
+    """Turn a datetime into a scalar comparable with the pickup column"""
+    if pa.types.is_timestamp(field_type):
+        return pa.scalar(value, type=field_type)
+    # Text timestamps ('2019-01-01 00:46:40') sort correctly as strings
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _partition_filter(names, start, end):
+    """Filter on partition columns so whole directories outside the range are skipped"""
+    if 'pickup_date' in names:
+        return (ds.field('pickup_date') >= start.strftime('%Y-%m-%d')) & \
+               (ds.field('pickup_date') <= end.strftime('%Y-%m-%d'))
+
+    if 'year' in names and 'month' in names:
+        months = None
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            expr = (ds.field('year') == year) & (ds.field('month') == month)
+            months = expr if months is None else months | expr
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return months
+
+    return None
+
+
+def load_trips(start=None, end=None):
+    """
+    Read trips from TRIPS_PATH, fetching only the columns the pipeline uses.
+    With a [start, end) pickup range, partitions and row groups outside it are never read.
+    """
+    if TRIPS_PATH.endswith('.csv'):
+        df = pd.read_csv(TRIPS_PATH)
+        pickup = pd.to_datetime(df['tpep_pickup_datetime'])
+        in_range = pd.Series(True, index=df.index)
+        if start:
+            in_range &= pickup >= start
+        if end:
+            in_range &= pickup < end
+        return df[in_range]
+
+    dataset = ds.dataset(TRIPS_PATH, format='parquet', partitioning='hive')
+    # The dataset takes its schema from the first file it finds. Old months only carry
+    # raw coordinates and new ones only LocationIDs, so merge every file's schema:
+    # columns a file does not have then come back as nulls instead of being dropped
+    file_schemas = [fragment.physical_schema for fragment in dataset.get_fragments()]
+    schema = pa.unify_schemas([dataset.schema] + file_schemas)
+    dataset = ds.dataset(TRIPS_PATH, schema=schema, format='parquet', partitioning='hive')
+    names = dataset.schema.names
+
+    # Column projection: stored columns plus the raw inputs of validation and geocoding
+    wanted = [col for col in COLS_TO_SAVE if col not in DERIVED_COLS]
+    for lon_col, lat_col in RAW_COORD_COLUMNS.values():
+        wanted += [lon_col, lat_col]
+    columns = [col for col in wanted if col in names]
+
+    # Row group statistics on the pickup column let pyarrow skip whole row groups
+    pickup = ds.field('tpep_pickup_datetime')
+    pickup_type = dataset.schema.field('tpep_pickup_datetime').type
+    conditions = []
+    if start:
+        conditions.append(pickup >= _pickup_bound(start, pickup_type))
+    if end:
+        conditions.append(pickup < _pickup_bound(end, pickup_type))
+    if start and end:
+        partitions = _partition_filter(names, start, end)
+        if partitions is not None:
+            conditions.append(partitions)
+
+    row_filter = None
+    for condition in conditions:
+        row_filter = condition if row_filter is None else row_filter & condition
+
+    return dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+
+
+def build_sketches(df_clean, zone_boroughs):
+    """
+    Summarize fares, durations and speeds per pickup borough and time_of_day
+    with KLL sketches, plus a HyperLogLog of distinct pickup/dropoff zone pairs.
+    """
+    frame = pd.DataFrame({
+        'borough': df_clean['PULocationID'].map(zone_boroughs).fillna('Unknown'),
+        'time_of_day': df_clean['time_of_day'].astype(str),
+        'fare': df_clean['total_amount'],
+        'duration': df_clean['trip_duration_seconds'] / 60,
+        'speed': df_clean['average_speed_mph'],
+        'od_hash': pd.util.hash_pandas_object(df_clean[['PULocationID', 'DOLocationID']], index=False),
+    })
+
+    rows = []
+    for (borough, time_of_day), group in frame.groupby(['borough', 'time_of_day']):
+        for metric in SKETCH_METRICS:
+            sketch = KLLSketch(seed=0)
+            sketch.add_many(group[metric].astype(float).tolist())
+            rows.append((borough, time_of_day, metric, 'kll', sketch.to_json()))
+
+        # Only distinct pairs matter, so hash each pair once
+        od_pairs = HyperLogLog()
+        for od_hash in group['od_hash'].unique().tolist():
+            od_pairs.add_hash(od_hash)
+        rows.append((borough, time_of_day, 'od_pairs', 'hll', od_pairs.to_json()))
+
+    return pd.DataFrame(rows, columns=['borough', 'time_of_day', 'metric', 'kind', 'data'])
+
+
+def build_trip_samples(df_clean, zone_boroughs, first_trip_id, kept=None):
+    """
+    Reservoir-sample trips per pickup borough and hour. Trips were inserted
+    in order after the last used id, so row i got trip_id first_trip_id + i.
+    kept counts the samples a stratum still holds from earlier loads,
+    which are only topped up to SAMPLES_PER_STRATUM.
+    """
+    kept = kept or {}
+    strata = pd.DataFrame({
+        'borough': df_clean['PULocationID'].map(zone_boroughs).fillna('Unknown').to_numpy(),
+        'hour': df_clean['tpep_pickup_datetime'].dt.hour.to_numpy(),
+    })
+
+    rows = []
+    for (borough, hour), positions in strata.groupby(['borough', 'hour']).indices.items():
+        seed = f"{SAMPLE_SEED}-{borough}-{hour}"
+        k = SAMPLES_PER_STRATUM - kept.get((borough, int(hour)), 0)
+        if k <= 0:
+            continue
+        for position in reservoir_sample(positions, k, seed=seed):
+            rows.append((first_trip_id + int(position), borough, int(hour)))
+
+    return pd.DataFrame(rows, columns=['trip_id', 'borough', 'hour'])
+
+
+def write_rejects_log(bad_df, start=None, end=None):
+    """
+    Write the suspicious records log. A --start/--end reload only replaces
+    the rows of its own pickup range, so /api/stats/quality still compares
+    the whole trips table with the rejects of the whole dataset.
+    """
+    if (start or end) and os.path.exists(LOG_FILE):
+        old_df = pd.read_csv(LOG_FILE)
+        pickup = pd.to_datetime(old_df['tpep_pickup_datetime'], errors='coerce')
+        in_range = pd.Series(True, index=old_df.index)
+        if start:
+            in_range &= pickup >= start
+        if end:
+            in_range &= pickup < end
+        bad_df = pd.concat([old_df[~in_range], bad_df], ignore_index=True)
+
+    bad_df.to_csv(LOG_FILE, index=False)
+
+
+def rebuild_sample_cells(conn):
+    """
+    Count trips per (pickup borough, hour) cell. Every cell keeps at most
+    SAMPLES_PER_STRATUM samples, so the API weights cells by these counts.
+    """
+    conn.execute("DROP TABLE IF EXISTS trip_sample_cells")
+    conn.execute("""
+        CREATE TABLE trip_sample_cells AS
+        SELECT COALESCE(z.Borough, 'Unknown')                         as borough,
+               CAST(strftime('%H', t.tpep_pickup_datetime) AS INTEGER) as hour,
+               COUNT(*)                                               as population
+        FROM trips t
+                 LEFT JOIN zones z ON t.PULocationID = z.LocationID
+        GROUP BY 1, 2
+    """)
+
+
+def refresh_trip_samples(conn, df_clean, zone_boroughs):
+    """
+    After a --start/--end reload the range's trips have new ids. Drop the
+    samples that pointed at the deleted rows and refill each stratum from
+    the rows just inserted.
+    """
+    try:
+        conn.execute("DELETE FROM trip_samples WHERE trip_id NOT IN (SELECT trip_id FROM trips)")
+    except sqlite3.OperationalError:
+        print("No trip sample yet, run without --start/--end to build it.")
+        return
+
+    kept = {}
+    for borough, hour, count in conn.execute("SELECT borough, hour, COUNT(*) FROM trip_samples GROUP BY borough, hour"):
+        kept[(borough, hour)] = count
+
+    # Ids are handed out in insert order, the range's rows are the last len(df_clean)
+    last_trip_id = conn.execute("SELECT MAX(trip_id) FROM trips").fetchone()[0] or 0
+    first_trip_id = last_trip_id - len(df_clean) + 1
+    samples = build_trip_samples(df_clean, zone_boroughs, first_trip_id, kept)
+    samples.to_sql('trip_samples', conn, if_exists='append', index=False)
+    rebuild_sample_cells(conn)
+    print(f"  - Replaced samples of the reloaded range ({len(samples)} trips sampled).")
+
+
+def rebuild_trip_stats(conn):
+    """Recount trips and fare totals per pickup borough from the trips table"""
+    conn.execute("DROP TABLE IF EXISTS trip_stats")
+    conn.execute("""
+        CREATE TABLE trip_stats AS
+        SELECT COALESCE(z.Borough, 'Unknown') as borough,
+               COUNT(*)                       as trip_count,
+               SUM(t.total_amount)            as fare_sum
+        FROM trips t
+                 LEFT JOIN zones z ON t.PULocationID = z.LocationID
+        GROUP BY COALESCE(z.Borough, 'Unknown')
+    """)
+    conn.execute("CREATE UNIQUE INDEX idx_trip_stats_borough ON trip_stats(borough)")
+
+
+def open_shadow_db(full_reload):
+    """
+    Create the shadow database the ETL writes into while the API keeps
+    reading DB_PATH. A full reload starts from the live schema with empty
+    tables (indexes are returned to be built after the bulk insert);
+    a partial reload starts from a copy of the live data.
+    Also returns the highest live trip_id at that moment: trips ingested
+    after it are carried over by swap_in_shadow_db.
+    """
+    if os.path.exists(SHADOW_DB_PATH):
+        os.remove(SHADOW_DB_PATH)
+
+    live = sqlite3.connect(DB_PATH)
+    shadow = sqlite3.connect(SHADOW_DB_PATH)
+    index_sql = []
+    try:
+        snapshot_max_id = live.execute("SELECT MAX(trip_id) FROM trips").fetchone()[0] or 0
+        if full_reload:
+            schema = live.execute("""
+                SELECT type, name, sql FROM sqlite_master
+                WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+            """).fetchall()
+            for kind, name, sql in schema:
+                if kind == 'index':
+                    index_sql.append((name, sql))
+                else:
+                    shadow.execute(sql)
+
+            # Small lookup tables are not produced by the ETL, carry them over.
+            # zones is replaced from ZONE_FILE when that loads, otherwise the live rows stay.
+            shadow.execute("ATTACH DATABASE ? AS live", (DB_PATH,))
+            shadow.execute("INSERT INTO vendors SELECT * FROM live.vendors")
+            shadow.execute("INSERT INTO zones SELECT * FROM live.zones")
+            shadow.commit()
+            shadow.execute("DETACH DATABASE live")
+        else:
+            live.backup(shadow)
+            snapshot_max_id = shadow.execute("SELECT MAX(trip_id) FROM trips").fetchone()[0] or 0
+    finally:
+        live.close()
+
+    return shadow, index_sql, snapshot_max_id
+
 
-def run_pipeline():
+def next_generation():
+    """Generation number of the live database plus one"""
+    live = sqlite3.connect(DB_PATH)
+    try:
+        return live.execute("SELECT MAX(generation) FROM db_generation").fetchone()[0] + 1
+    except (sqlite3.OperationalError, TypeError):
+        return 1
+    finally:
+        live.close()
+
+
+def finish_shadow_db(conn, index_sql):
+    """Build indexes, refresh planner statistics and stamp a new generation"""
+    print("Building indexes...")
+    for name, sql in index_sql:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+        if not exists:
+            conn.execute(sql)
+
+    generation = next_generation()
+    conn.execute("CREATE TABLE IF NOT EXISTS db_generation (generation INTEGER, built_at TEXT)")
+    conn.execute("DELETE FROM db_generation")
+    conn.execute("INSERT INTO db_generation VALUES (?, ?)", (generation, datetime.now().isoformat()))
+    conn.commit()
+
+    print("Running ANALYZE...")
+    conn.execute("ANALYZE")
+    conn.commit()
+    return generation
+
+
+def swap_in_shadow_db(snapshot_max_id):
+    """
+    Rename the shadow over DB_PATH without losing live ingestion.
+    BEGIN IMMEDIATE on the live file holds off /api/ingest writers; trips
+    they committed after the snapshot are copied into the shadow (with new
+    ids) and counted in trip_stats, then the file is renamed while the lock
+    is still held. Writers that were waiting notice the swap and retry.
+    """
+    live = sqlite3.connect(DB_PATH, timeout=60)
+    try:
+        live.execute("BEGIN IMMEDIATE")
+
+        shadow = sqlite3.connect(SHADOW_DB_PATH)
+        try:
+            shadow.execute("ATTACH DATABASE ? AS live", (DB_PATH,))
+            shadow_max_id = shadow.execute("SELECT MAX(trip_id) FROM trips").fetchone()[0] or 0
+            columns = ','.join(COLS_TO_SAVE)
+            copied = shadow.execute(f"""
+                INSERT INTO trips ({columns})
+                SELECT {columns} FROM live.trips WHERE trip_id > ? ORDER BY trip_id
+            """, (snapshot_max_id,)).rowcount
+
+            if copied > 0:
+                shadow.execute("""
+                    INSERT INTO trip_stats (borough, trip_count, fare_sum)
+                    SELECT COALESCE(z.Borough, 'Unknown'), COUNT(*), SUM(t.total_amount)
+                    FROM trips t
+                             LEFT JOIN zones z ON t.PULocationID = z.LocationID
+                    WHERE t.trip_id > ?
+                    GROUP BY COALESCE(z.Borough, 'Unknown')
+                    ON CONFLICT(borough) DO UPDATE SET trip_count = trip_count + excluded.trip_count,
+                                                       fare_sum   = fare_sum + excluded.fare_sum
+                """, (shadow_max_id,))
+                print(f"  - Carried over {copied} trips ingested while the ETL was running.")
+            shadow.commit()
+            shadow.execute("DETACH DATABASE live")
+        finally:
+            shadow.close()
+
+        # Atomic swap: readers either keep the old file or open the new one
+        os.replace(SHADOW_DB_PATH, DB_PATH)
+    finally:
+        # Releases the lock on the old file, which nothing opens any more
+        live.close()
+
+
+def run_pipeline(start=None, end=None):
     print(f"Starting ETL Pipeline...")
     print(f"Database Path: {DB_PATH}")
 
@@ -23,10 +372,18 @@ def run_pipeline():
     if not os.path.exists(LOG_DIR):
         os.makedirs(LOG_DIR)
 
-    conn = sqlite3.connect(DB_PATH)
+    if not os.path.exists(DB_PATH):
+        print(f"Error: No database at {DB_PATH}. Run scripts/init_db.py first.")
+        return
+
+    # Build everything in a shadow copy so the API never sees a half-loaded table
+    full_reload = not (start or end)
+    conn, index_sql, snapshot_max_id = open_shadow_db(full_reload)
+    built = False
 
     # 1. Load Zones
     valid_zones = set()
+    zone_boroughs = {}
     try:
         print("Loading zones...")
         if os.path.exists(ZONE_FILE):
@@ -34,135 +391,87 @@ def run_pipeline():
             # Create zones table if it doesn't exist
             zones_df.to_sql('zones', conn, if_exists='replace', index=False)
             valid_zones = set(zones_df['LocationID'].unique())
+            zone_boroughs = dict(zip(zones_df['LocationID'], zones_df['Borough']))
             print(f"Loaded {len(zones_df)} zones.")
         else:
-            print(f"Warning: Zone file not found at {ZONE_FILE}. Skipping zone validation.")
+            print(f"Warning: Zone file not found at {ZONE_FILE}. Keeping the current zones, skipping zone validation.")
+            # Boroughs are still needed to label the sketches and samples
+            zone_boroughs = dict(conn.execute("SELECT LocationID, Borough FROM zones").fetchall())
     except Exception as e:
         print(f"Zone Error: {e}")
 
     # 2. Process Trips
     print("Processing Data...")
     try:
-        # Load Data (Adjust for CSV or Parquet)
-        if TRIPS_FILE.endswith('.parquet'):
-            df = pd.read_parquet(TRIPS_FILE)
-        else:
-            df = pd.read_csv(TRIPS_FILE)
-
-        # Precalculations
-        df['tpep_pickup_datetime'] = pd.to_datetime(df['tpep_pickup_datetime'])
-        df['tpep_dropoff_datetime'] = pd.to_datetime(df['tpep_dropoff_datetime'])
-
-        # Calculate Duration (Seconds)
-        df['trip_duration_seconds'] = (df['tpep_dropoff_datetime'] - df['tpep_pickup_datetime']).dt.total_seconds()
-
-        # Calculate Speed (MPH)
-        # Handle division by zero using numpy to avoid crash, then fill NA
-        df['speed_mph'] = (df['trip_distance'] / (df['trip_duration_seconds'] / 3600))
-        df['speed_mph'] = df['speed_mph'].replace([np.inf, -np.inf], 0).fillna(0)
-        df['average_speed_mph'] = df['speed_mph']
-
-        # suspicious data
-
-        # 1. Fare Outlier / Price Gouging (Fixes $185/0.4mi bug)
-        # Rejects trips that cost more than $50 but went less than 0.5 miles
-        mask_price_anomaly = (df['total_amount'] > 50) & (df['trip_distance'] < 0.5)
-
-        # 2. Impossible Short-Distance Speed
-        # Rejects trips < 1.0 mile with speeds > 30 mph
-        mask_short_speed = (df['trip_distance'] < 1.0) & (df['average_speed_mph'] > 30)
-
-        # 3. Standard Zero Distance/High Fare
-        mask_distance = (df['trip_distance'] <= 0.1) & (df['total_amount'] > 10.0)
-
-        # 4. Negative/Zero Fares
-        mask_fare = df['total_amount'] <= 0
-
-        # 5. Invalid Duration (Negative time or > 12 hours)
-        mask_time = (df['trip_duration_seconds'] <= 0) | (df['trip_duration_seconds'] > 43200)
+        # Load Data (partitioned dataset, Parquet or CSV)
+        if start or end:
+            print(f"Pickup range: {start or 'beginning'} -> {end or 'end'}")
+        df = load_trips(start, end)
 
-        # 6. Extreme Speed (> 100 mph overall)
-        mask_speed = (df['average_speed_mph'] > 100) | (df['average_speed_mph'] < 0)
+        # Older files and GPS feeds only carry raw coordinates
+        df = geocode_trips(df)
 
-        # 7. Unknown Zones
-        if valid_zones:
-            mask_zone = (~df['PULocationID'].isin(valid_zones)) | \
-                        (~df['DOLocationID'].isin(valid_zones))
-        else:
-            mask_zone = pd.Series([False] * len(df))
+        # Precalculations
+        df = add_derived_columns(df)
 
-        # Combine all masks including the rules
-        mask_suspicious = (mask_price_anomaly | mask_short_speed | mask_distance |
-                           mask_fare | mask_time | mask_speed | mask_zone)
+        # suspicious data (rules live in validation.py, shared with /api/ingest)
+        mask_suspicious, rejection_reasons = find_suspicious(df, valid_zones)
 
         # Log suspicious records
         bad_count = mask_suspicious.sum()
         if bad_count > 0:
             print(f"Found {bad_count} suspicious records.")
-            bad_df = df[mask_suspicious].copy()
-
-            # Updated labels to reflect the logic
-            conditions = [
-                mask_price_anomaly[mask_suspicious],
-                mask_short_speed[mask_suspicious],
-                mask_distance[mask_suspicious],
-                mask_fare[mask_suspicious],
-                mask_speed[mask_suspicious],
-                mask_time[mask_suspicious],
-                mask_zone[mask_suspicious]
-            ]
-
-            choices = [
-                'Fare Outlier (Short Trip)',
-                'Impossible Short Speed',
-                'Zero Distance/High Fare',
-                'Negative/Zero Fare',
-                'Extreme Speed',
-                'Invalid Duration',
-                'Unknown Zone'
-            ]
-
-            bad_df['rejection_reason'] = np.select(conditions, choices, default='Unknown')
-            bad_df.to_csv(LOG_FILE, index=False)
+        bad_df = df[mask_suspicious].copy()
+        bad_df['rejection_reason'] = rejection_reasons
+        if bad_count > 0 or start or end:
+            write_rejects_log(bad_df, start, end)
             print(f"  - Logged to {LOG_FILE}")
 
         # --- D. Filter & Save Clean Data ---
         df_clean = df[~mask_suspicious].copy()
 
         # E. Feature Engineering
-        hours = df_clean['tpep_pickup_datetime'].dt.hour
-        df_clean['time_of_day'] = pd.cut(hours,
-                                         bins=[-1, 5, 11, 16, 20, 24],
-                                         labels=['Night', 'Morning', 'Afternoon', 'Evening', 'Night'],
-                                         ordered=False)
+        df_clean = prepare_clean(df_clean)
 
         # Ensure columns match DB schema
-        cols_to_save = [
-            'VendorID', 'tpep_pickup_datetime', 'tpep_dropoff_datetime', 'passenger_count',
-            'trip_distance', 'RatecodeID', 'store_and_fwd_flag', 'PULocationID', 'DOLocationID',
-            'payment_type', 'fare_amount', 'extra', 'mta_tax', 'tip_amount', 'tolls_amount',
-            'improvement_surcharge', 'total_amount', 'congestion_surcharge',
-            'trip_duration_seconds', 'average_speed_mph', 'time_of_day'
-        ]
-
-        # Handle missing columns safely
-        for col in cols_to_save:
-            if col not in df_clean.columns:
-                df_clean[col] = 0  # Default value if missing
-        if 'congestion_surcharge' in df_clean.columns:
-            df_clean['congestion_surcharge'] = df_clean['congestion_surcharge'].fillna(0.00)
+        cols_to_save = COLS_TO_SAVE
 
 
         print("Saving clean data to Database...")
 
-        # Clear old data to verify the filter works
-        conn.execute("DELETE FROM trips")
+        # Clear old data to verify the filter works (only the reprocessed range)
+        if start or end:
+            conn.execute("DELETE FROM trips WHERE tpep_pickup_datetime >= ? AND tpep_pickup_datetime < ?",
+                         (str(start or datetime.min), str(end or datetime.max)))
+        else:
+            conn.execute("DELETE FROM trips")
 
         # Insert new clean data
         df_clean[cols_to_save].to_sql('trips', conn, if_exists='append', index=False, chunksize=10000)
 
+        # Per-borough counters behind /api/stats/summary (kept current by /api/ingest)
+        rebuild_trip_stats(conn)
+
+        # Sketches can not forget rows, so they are only rebuilt from a full run
+        if start or end:
+            print("Skipping sketches for a partial reload (run without --start/--end to rebuild).")
+            print("Refreshing stratified trip sample for the range...")
+            refresh_trip_samples(conn, df_clean, zone_boroughs)
+        else:
+            print("Building percentile and distinct-count sketches...")
+            build_sketches(df_clean, zone_boroughs).to_sql('sketches', conn, if_exists='replace', index=False)
+
+            print("Building stratified trip sample...")
+            first_trip_id = conn.execute("SELECT MIN(trip_id) FROM trips").fetchone()[0] or 1
+            samples = build_trip_samples(df_clean, zone_boroughs, first_trip_id)
+            samples.to_sql('trip_samples', conn, if_exists='replace', index=False)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sample_borough ON trip_samples(borough)")
+            rebuild_sample_cells(conn)
+
         conn.commit()
-        print(f"Success! ETL Completed.")
+        generation = finish_shadow_db(conn, index_sql)
+        built = True
+        print(f"Success! ETL Completed (database generation {generation}).")
         print(f"Total Rows Processed: {len(df)}")
         print(f"Clean Rows Inserted:  {len(df_clean)}")
         print(f"Rejected Rows:        {bad_count}")
@@ -174,6 +483,24 @@ def run_pipeline():
     finally:
         conn.close()
 
+    if built:
+        try:
+            swap_in_shadow_db(snapshot_max_id)
+            print(f"Swapped new database into {DB_PATH}")
+        except sqlite3.Error as e:
+            print(f"Swap Error: {e}")
+            built = False
+
+    if not built and os.path.exists(SHADOW_DB_PATH):
+        os.remove(SHADOW_DB_PATH)
+        print("Live database left unchanged.")
+
 
 if __name__ == "__main__":
-    run_pipeline()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load, validate and store taxi trips")
+    parser.add_argument('--start', type=datetime.fromisoformat, default=None,
+                        help="first pickup time to (re)process, e.g. 2019-01-07")
+    parser.add_argument('--end', type=datetime.fromisoformat, default=None,
+                        help="pickup time to stop before, e.g. 2019-01-14")
+    args = parser.parse_args()
+    run_pipeline(args.start, args.end)
\ No newline at end of file
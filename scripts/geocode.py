@@ -0,0 +1,106 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# --- CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+SHP_FILE = os.path.join(PROJECT_ROOT, 'data', 'taxi_zones', 'taxi_zones.shp')
+CHUNK_SIZE = 500000
+UNKNOWN_ZONE = 0  # Not a real LocationID, so the ETL zone mask rejects it
+
+# Raw coordinate columns used by older yellow taxi files and GPS feeds
+RAW_COORD_COLUMNS = {
+    'PULocationID': ('pickup_longitude', 'pickup_latitude'),
+    'DOLocationID': ('dropoff_longitude', 'dropoff_latitude'),
+}
+
+# Set once per worker process by _init_worker
+_tree = None
+_location_ids = None
+
+
+def load_zone_polygons():
+    """Read taxi zone polygons in Lat/Lon along with their LocationIDs"""
+    gdf = gpd.read_file(SHP_FILE)
+    if gdf.crs and gdf.crs.to_string() != 'EPSG:4326':
+        gdf = gdf.to_crs("EPSG:4326")
+    return gdf.geometry.values, gdf['LocationID'].to_numpy()
+
+
+def _init_worker(polygons, location_ids):
+    """Build the STRtree once per worker instead of once per chunk"""
+    global _tree, _location_ids
+    _tree = shapely.STRtree(polygons)
+    _location_ids = location_ids
+
+
+def _assign_chunk(coords):
+    """Assign a LocationID to every (lon, lat) point of one chunk"""
+    lon, lat = coords
+    points = shapely.points(lon, lat)
+
+    # One bulk query: pairs of (point index, polygon index) where the point lies in the polygon
+    point_idx, zone_idx = _tree.query(points, predicate='intersects')
+
+    result = np.full(len(lon), UNKNOWN_ZONE, dtype=np.int64)
+    result[point_idx] = _location_ids[zone_idx]
+    return result
+
+
+def assign_location_ids(lon, lat, polygons=None, location_ids=None, workers=None):
+    """
+    Map arrays of longitudes and latitudes to taxi zone LocationIDs.
+    Points outside every zone (or with missing coordinates) get UNKNOWN_ZONE.
+    """
+    if polygons is None:
+        polygons, location_ids = load_zone_polygons()
+
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    chunks = [(lon[i:i + CHUNK_SIZE], lat[i:i + CHUNK_SIZE]) for i in range(0, len(lon), CHUNK_SIZE)]
+    if not chunks:
+        return np.empty(0, dtype=np.int64)
+
+    # Small inputs are not worth starting worker processes for
+    if len(chunks) == 1 or workers == 1:
+        _init_worker(polygons, location_ids)
+        return np.concatenate([_assign_chunk(c) for c in chunks])
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(polygons, location_ids)) as pool:
+        return np.concatenate(list(pool.map(_assign_chunk, chunks)))
+
+
+def geocode_trips(df, workers=None):
+    """
+    Fill PULocationID/DOLocationID from raw pickup/dropoff coordinates.
+    Only rows without an ID but with coordinates are geocoded, so a dataset
+    mixing old (coordinates) and new (LocationID) files keeps the IDs it has.
+    """
+    polygons, location_ids = None, None
+    for id_col, (lon_col, lat_col) in RAW_COORD_COLUMNS.items():
+        if lon_col not in df.columns or lat_col not in df.columns:
+            continue
+
+        if id_col not in df.columns:
+            df[id_col] = np.nan
+        needed = df[id_col].isna() & df[lon_col].notna() & df[lat_col].notna()
+        if not needed.any():
+            continue
+
+        if polygons is None:
+            print("Loading taxi zone polygons for geocoding...")
+            polygons, location_ids = load_zone_polygons()
+
+        print(f"  - Assigning {id_col} from {lon_col}/{lat_col} ({int(needed.sum())} points)...")
+        geocoded = pd.Series(assign_location_ids(df.loc[needed, lon_col].to_numpy(), df.loc[needed, lat_col].to_numpy(),
+                                                 polygons, location_ids, workers),
+                             index=df.index[needed])
+        df[id_col] = df[id_col].fillna(geocoded)
+        unmatched = int((geocoded == UNKNOWN_ZONE).sum())
+        print(f"    {unmatched} points fell outside every zone.")
+    return df
@@ -79,6 +79,46 @@ def create_schema():
         );
     """)
 
+  # 4. Sketches (percentile / distinct-count summaries built by the ETL)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sketches (
+            borough TEXT,
+            time_of_day TEXT,
+            metric TEXT,
+            kind TEXT,
+            data TEXT
+        );
+    """)
+
+  # 5. Trip samples (stratified reservoir sample built by the ETL)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS trip_samples (
+            trip_id INTEGER,
+            borough TEXT,
+            hour INTEGER,
+            FOREIGN KEY (trip_id) REFERENCES trips(trip_id)
+        );
+    """)
+
+  # Trips per sample cell, so the sample can be drawn in proportion to the real data
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS trip_sample_cells (
+            borough TEXT,
+            hour INTEGER,
+            population INTEGER
+        );
+    """)
+
+  # 6. Trip stats (per-borough counters behind the dashboard summary)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS trip_stats (
+            borough TEXT,
+            trip_count INTEGER,
+            fare_sum DECIMAL(14, 2)
+        );
+    """)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_trip_stats_borough ON trip_stats(borough);")
+
   # creating indexes to speed up queries
     print("Creating indexes...")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_pickup ON trips(PULocationID);")
@@ -0,0 +1,178 @@
+"""
+Production entry point for the API.
+
+A master process opens the listening socket, loads the app once and forks
+worker processes that share that socket. Each worker warms up before it
+starts accepting connections, and serves requests with a fixed thread pool.
+
+    python serve.py --workers 4 --threads 8 --port 5000
+"""
+
+import time
+
+# Measured before anything else is imported
+PROCESS_STARTED = time.perf_counter()
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+# Seconds the master waits before replacing a worker that died
+RESPAWN_DELAY = 1.0
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Skips the per-request access log line, which costs throughput under load"""
+
+    def log_request(self, code='-', size='-'):
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server that hands each connection to a fixed-size thread pool"""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd=None, access_log=False):
+        handler = WSGIRequestHandler if access_log else QuietRequestHandler
+        super().__init__(host, port, app, handler=handler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def open_socket(host, port, backlog=1024):
+    """Listening socket created once by the master and inherited by every worker"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(number, app, warm_up, shut_down, host, sock, threads, access_log):
+    """
+    Warm up, then serve from the shared socket until the master stops us.
+    On SIGTERM, requests in flight are finished and shut_down() flushes
+    whatever the app still buffers (ingested rows) before we exit.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is handled by the master
+
+    warm_up_seconds = warm_up()
+    print(f"  - worker {number} (pid {os.getpid()}) warmed up in {warm_up_seconds:.2f}s, "
+          f"ready after {time.perf_counter() - PROCESS_STARTED:.2f}s")
+
+    server = PooledWSGIServer(host, sock.getsockname()[1], app, threads, fd=sock.fileno(), access_log=access_log)
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever to return, so it can not run on this thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    server.serve_forever()
+    server.pool.shutdown(wait=True)
+    shut_down()
+
+
+def serve(host, port, workers, threads, access_log=False):
+    sock = open_socket(host, port)
+
+    # Load the app once in the master, workers share it copy-on-write
+    import_started = time.perf_counter()
+    from app import app, warm_up, shut_down
+    print(f"App loaded in {time.perf_counter() - import_started:.2f}s")
+
+    # No fork on Windows: serve from this process instead
+    if not hasattr(os, 'fork'):
+        print("os.fork is not available, running a single worker.")
+        run_worker(0, app, warm_up, shut_down, host, sock, threads, access_log)
+        return
+
+    children = {}
+    stopping = False
+
+    def spawn(number):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                run_worker(number, app, warm_up, shut_down, host, sock, threads, access_log)
+            except Exception:
+                # os._exit skips the normal traceback printing, so print it ourselves
+                print(f"Worker {number} (pid {os.getpid()}) crashed:")
+                traceback.print_exc()
+                status = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(status)
+        children[pid] = number
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Serving on http://{host}:{port} with {workers} worker(s) x {threads} thread(s)")
+    for number in range(workers):
+        spawn(number)
+
+    # Replace workers that die, until we are asked to stop
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        number = children.pop(pid, None)
+        if number is not None and not stopping:
+            print(f"Worker {number} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, "
+                  f"restarting it in {RESPAWN_DELAY}s.")
+            # A worker that crashes on start would otherwise be respawned in a tight loop
+            time.sleep(RESPAWN_DELAY)
+            if not stopping:
+                spawn(number)
+
+    sock.close()
+    print("All workers stopped.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes")
+    parser.add_argument('--host', default=os.environ.get('API_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('API_PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('API_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('API_THREADS', 8)))
+    parser.add_argument('--access-log', action='store_true', help="print one line per request")
+    args = parser.parse_args()
+
+    if args.workers < 1 or args.threads < 1:
+        print("Error: --workers and --threads must be at least 1")
+        sys.exit(1)
+
+    serve(args.host, args.port, args.workers, args.threads, args.access_log)
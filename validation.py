@@ -0,0 +1,114 @@
+"""
+Trip validation rules shared by the batch ETL and live ingestion.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Columns stored in the trips table
+COLS_TO_SAVE = [
+    'VendorID', 'tpep_pickup_datetime', 'tpep_dropoff_datetime', 'passenger_count',
+    'trip_distance', 'RatecodeID', 'store_and_fwd_flag', 'PULocationID', 'DOLocationID',
+    'payment_type', 'fare_amount', 'extra', 'mta_tax', 'tip_amount', 'tolls_amount',
+    'improvement_surcharge', 'total_amount', 'congestion_surcharge',
+    'trip_duration_seconds', 'average_speed_mph', 'time_of_day'
+]
+# Computed from the other columns, never read from the source
+DERIVED_COLS = {'trip_duration_seconds', 'average_speed_mph', 'time_of_day'}
+
+
+def add_derived_columns(df):
+    """Parse timestamps and calculate duration and speed"""
+    # Precalculations
+    df['tpep_pickup_datetime'] = pd.to_datetime(df['tpep_pickup_datetime'])
+    df['tpep_dropoff_datetime'] = pd.to_datetime(df['tpep_dropoff_datetime'])
+
+    # Calculate Duration (Seconds)
+    df['trip_duration_seconds'] = (df['tpep_dropoff_datetime'] - df['tpep_pickup_datetime']).dt.total_seconds()
+
+    # Calculate Speed (MPH)
+    # Handle division by zero using numpy to avoid crash, then fill NA
+    df['speed_mph'] = (df['trip_distance'] / (df['trip_duration_seconds'] / 3600))
+    df['speed_mph'] = df['speed_mph'].replace([np.inf, -np.inf], 0).fillna(0)
+    df['average_speed_mph'] = df['speed_mph']
+    return df
+
+
+def find_suspicious(df, valid_zones):
+    """
+    Apply every rule to the whole frame at once.
+    Returns the combined mask and the rejection reason of each flagged row.
+    """
+    # 1. Fare Outlier / Price Gouging (Fixes $185/0.4mi bug)
+    # Rejects trips that cost more than $50 but went less than 0.5 miles
+    mask_price_anomaly = (df['total_amount'] > 50) & (df['trip_distance'] < 0.5)
+
+    # 2. Impossible Short-Distance Speed
+    # Rejects trips < 1.0 mile with speeds > 30 mph
+    mask_short_speed = (df['trip_distance'] < 1.0) & (df['average_speed_mph'] > 30)
+
+    # 3. Standard Zero Distance/High Fare
+    mask_distance = (df['trip_distance'] <= 0.1) & (df['total_amount'] > 10.0)
+
+    # 4. Negative/Zero Fares
+    mask_fare = df['total_amount'] <= 0
+
+    # 5. Invalid Duration (Negative time or > 12 hours)
+    mask_time = (df['trip_duration_seconds'] <= 0) | (df['trip_duration_seconds'] > 43200)
+
+    # 6. Extreme Speed (> 100 mph overall)
+    mask_speed = (df['average_speed_mph'] > 100) | (df['average_speed_mph'] < 0)
+
+    # 7. Unknown Zones
+    if valid_zones:
+        mask_zone = (~df['PULocationID'].isin(valid_zones)) | \
+                    (~df['DOLocationID'].isin(valid_zones))
+    else:
+        mask_zone = pd.Series(False, index=df.index)
+
+    # Combine all masks including the rules
+    mask_suspicious = (mask_price_anomaly | mask_short_speed | mask_distance |
+                       mask_fare | mask_time | mask_speed | mask_zone)
+
+    # Updated labels to reflect the logic
+    conditions = [
+        mask_price_anomaly[mask_suspicious],
+        mask_short_speed[mask_suspicious],
+        mask_distance[mask_suspicious],
+        mask_fare[mask_suspicious],
+        mask_speed[mask_suspicious],
+        mask_time[mask_suspicious],
+        mask_zone[mask_suspicious]
+    ]
+
+    choices = [
+        'Fare Outlier (Short Trip)',
+        'Impossible Short Speed',
+        'Zero Distance/High Fare',
+        'Negative/Zero Fare',
+        'Extreme Speed',
+        'Invalid Duration',
+        'Unknown Zone'
+    ]
+
+    reasons = pd.Series(np.select(conditions, choices, default='Unknown'),
+                        index=df.index[mask_suspicious])
+    return mask_suspicious, reasons
+
+
+def prepare_clean(df_clean):
+    """Add time_of_day and make the columns match the trips table"""
+    # Feature Engineering
+    hours = df_clean['tpep_pickup_datetime'].dt.hour
+    df_clean['time_of_day'] = pd.cut(hours,
+                                     bins=[-1, 5, 11, 16, 20, 24],
+                                     labels=['Night', 'Morning', 'Afternoon', 'Evening', 'Night'],
+                                     ordered=False)
+
+    # Handle missing columns safely
+    for col in COLS_TO_SAVE:
+        if col not in df_clean.columns:
+            df_clean[col] = 0  # Default value if missing
+    if 'congestion_surcharge' in df_clean.columns:
+        df_clean['congestion_surcharge'] = df_clean['congestion_surcharge'].fillna(0.00)
+    return df_clean